@@ -0,0 +1,82 @@
+"""
+Compares ``fs.files`` with the previous glob based resolution on a synthetic translation tree.
+
+usage: python benchmarks/fs_files.py [max_files]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+from pathlib import Path
+from collections import defaultdict
+
+import parse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from validator import fs  # noqa: E402
+
+LOCALES = 60
+
+
+def legacy_files(pattern, params, **kwargs):
+    files = defaultdict(list)
+    wildcard_pattern = pattern.format(**{k: '*' for k in params})
+    paths = list(Path().glob(wildcard_pattern))
+    parse_pattern = pattern.replace('**', '{}').replace('*', '{}')
+    parser = parse.compile(parse_pattern)
+    values = []
+    wildcard_paths = set()
+    for path in paths:
+        result = parser.parse(str(path))
+        wildcard_paths.add(result.fixed)
+        values.append(result.named)
+    for wildcard_path in wildcard_paths:
+        base_path = Path(parse_pattern.format(*wildcard_path, **kwargs))
+        for value in values:
+            other_path = Path(parse_pattern.format(*wildcard_path, **value))
+            if other_path != base_path and other_path not in files[base_path]:
+                files[base_path].append(other_path)
+    return [[k] + v for k, v in files.items()]
+
+
+def make_tree(root, file_count):
+    for locale in range(LOCALES):
+        directory = os.path.join(root, 'res', 'values-l%02d' % locale)
+        os.makedirs(directory)
+        for index in range(file_count):
+            open(os.path.join(directory, 'strings%04d.xml' % index), 'w').close()
+
+
+def groups(rows):
+    return {row[0]: frozenset(row[1:]) for row in rows}
+
+
+def measure(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main(max_files):
+    cwd = os.getcwd()
+    print('%8s %8s %12s %12s' % ('files', 'paths', 'legacy [s]', 'fs.files [s]'))
+    file_count = 10
+    while file_count <= max_files:
+        root = tempfile.mkdtemp()
+        try:
+            make_tree(root, file_count)
+            os.chdir(root)
+            pattern = 'res/values-{lang}/*.xml'
+            legacy_time, legacy = measure(lambda: legacy_files(pattern, ['lang'], lang='l00'))
+            new_time, new = measure(lambda: list(fs.files(pattern, lang='l00')))
+            assert groups(legacy) == groups(new)
+            print('%8d %8d %12.3f %12.3f' % (file_count, file_count * LOCALES, legacy_time, new_time))
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(root)
+        file_count = file_count * 2
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 320)
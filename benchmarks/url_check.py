@@ -0,0 +1,47 @@
+"""
+Measures the url status checks against the local stand-in server and the replay of the recorded statuses.
+
+usage: python benchmarks/url_check.py [url_count]
+"""
+import os
+import sys
+import time
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+from validator.errors import UrlDiff  # noqa: E402
+from validator.checks.url import UrlStatusChecker, RetryPolicy  # noqa: E402
+import url_server  # noqa: E402
+
+
+def measure(checker, urls):
+    start = time.perf_counter()
+    invalid = checker.check([UrlDiff(url) for url in urls])
+    return time.perf_counter() - start, len(invalid)
+
+
+def main(url_count):
+    stop = url_server.start()
+    directory = tempfile.mkdtemp()
+    try:
+        urls = url_server.make_urls(url_count)
+        cassette = os.path.join(directory, 'urls.json')
+        print('%12s %8s %8s %10s %10s' % ('mode', 'urls', 'invalid', 'time [s]', 'urls/s'))
+        for concurrency in (10, 50, 200):
+            checker = UrlStatusChecker(concurrency=concurrency, retry_policy=RetryPolicy(backoff=0.05),
+                                       cassette=cassette, cassette_mode='record')
+            elapsed, invalid = measure(checker, urls)
+            mode = 'network/%d' % concurrency
+            print('%12s %8d %8d %10.3f %10.1f' % (mode, len(urls), invalid, elapsed, len(urls) / elapsed))
+            print('    %s' % checker.stats)
+        elapsed, invalid = measure(UrlStatusChecker(cassette=cassette), urls)
+        print('%12s %8d %8d %10.3f %10.1f' % ('replay', len(urls), invalid, elapsed, len(urls) / elapsed))
+    finally:
+        shutil.rmtree(directory)
+        stop()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
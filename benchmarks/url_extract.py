@@ -0,0 +1,65 @@
+"""
+Compares the url extraction with the previous backtracking regex on adversarial and ordinary texts. The legacy
+regex runs in a separate process and is stopped after ``timeout`` seconds.
+
+usage: python benchmarks/url_extract.py [max_size] [timeout]
+"""
+import os
+import re
+import sys
+import time
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from validator.checks.url import _find_urls  # noqa: E402
+
+LEGACY_URL_PATTERN = r'(?i)\b((?:https?://|www\d{0,3}[.]|(!keepsafe://)[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()\[\]<>]' \
+    r'+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[' \
+    r'\];:\'".,<>?\xab\xbb“”‘’]))'
+
+TEXTS = {
+    'unclosed paren': lambda size: 'see http://example.com/(' + 'a' * size + ' for details',
+    'parens': lambda size: 'see http://example.com/' + 'a(b)' * (size // 4) + '!',
+    'nested parens': lambda size: 'see http://example.com/' + '(a(b)' * (size // 5) + ' ok',
+    'prose': lambda size: 'Visit http://example.com/page?id=1, or www.example.org (the docs). ' * (size // 70 + 1),
+}
+
+
+def legacy_find_urls(content):
+    return [match.group() for match in re.finditer(LEGACY_URL_PATTERN, content)]
+
+
+def measure(func, content):
+    start = time.perf_counter()
+    result = list(func(content))
+    return time.perf_counter() - start, result
+
+
+def measure_legacy(content, timeout):
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply_async(measure, (legacy_find_urls, content)).get(timeout)
+    except multiprocessing.TimeoutError:
+        return None, None
+    finally:
+        pool.terminate()
+
+
+def main(max_size, timeout):
+    print('%16s %8s %12s %12s' % ('text', 'size', 'legacy [s]', 'new [s]'))
+    for name, make_text in TEXTS.items():
+        size = 16
+        legacy_stopped = False
+        while size <= max_size:
+            content = make_text(size)
+            legacy_time, legacy = (None, None) if legacy_stopped else measure_legacy(content, timeout)
+            legacy_stopped = legacy_time is None
+            new_time, new = measure(_find_urls, content)
+            assert legacy is None or legacy == new
+            legacy_text = '> %g' % timeout if legacy_time is None else '%.4f' % legacy_time
+            print('%16s %8d %12s %12.4f' % (name, len(content), legacy_text, new_time))
+            size = size * 4
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2 ** 20, float(sys.argv[2]) if len(sys.argv) > 2 else 5)
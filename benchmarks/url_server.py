@@ -0,0 +1,82 @@
+"""
+Local stand-in for the hosts linked from the content, every port acts as a separate host.
+
+``/<status>/<delay ms>/<anything>`` answers with the status after the delay, ``make_urls`` builds a list of such
+urls with a realistic mix of latencies and errors.
+
+usage: python benchmarks/url_server.py [port] [hosts]
+"""
+import sys
+import random
+import asyncio
+import threading
+
+from aiohttp import web
+
+# status code and its share of the urls
+STATUS_MIX = ((200, 0.85), (404, 0.06), (301, 0.04), (503, 0.03), (500, 0.02))
+
+
+@asyncio.coroutine
+def handle(request):
+    status = int(request.match_info['status'])
+    yield from asyncio.sleep(int(request.match_info['delay']) / 1000)
+    headers = {'Location': '/200/0/redirected'} if 300 <= status < 400 else {}
+    return web.Response(status=status, headers=headers, body=b'x' * 1024)
+
+
+def make_app():
+    app = web.Application()
+    app.router.add_route('*', '/{status:\\d+}/{delay:\\d+}/{name:.*}', handle)
+    return app
+
+
+def start(port=8900, hosts=4):
+    """
+    Runs the server in a background thread and returns the stop function.
+    """
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(make_app())
+    started = threading.Event()
+
+    def run():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(runner.setup())
+        for offset in range(hosts):
+            loop.run_until_complete(web.TCPSite(runner, '127.0.0.1', port + offset).start())
+        started.set()
+        loop.run_forever()
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    started.wait()
+
+    def stop():
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    return stop
+
+
+def make_urls(count, port=8900, hosts=4, min_delay=5, max_delay=200, seed=0):
+    rand = random.Random(seed)
+    statuses, weights = zip(*STATUS_MIX)
+    urls = []
+    for index in range(count):
+        status = rand.choices(statuses, weights)[0]
+        delay = int(rand.uniform(min_delay, max_delay))
+        urls.append('http://127.0.0.1:%d/%d/%d/%d' % (port + index % hosts, status, delay, index))
+    return urls
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8900
+    hosts = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    stop = start(port, hosts)
+    print('serving on 127.0.0.1:%d-%d, press enter to stop' % (port, port + hosts - 1))
+    try:
+        input()
+    finally:
+        stop()
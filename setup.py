@@ -29,5 +29,6 @@ setup(
     package_data={},
     namespace_packages=[],
     install_requires=reqs,
+    python_requires='>=3.5.3',
     entry_points={'console_scripts': ['content-validator = validator:main']},
     include_package_data=False)
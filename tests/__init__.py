@@ -1,5 +1,6 @@
 import asyncio
 from unittest import TestCase
+from unittest.mock import patch
 
 
 class AsyncTestCase(TestCase):
@@ -18,3 +19,9 @@ class AsyncTestCase(TestCase):
         fut = asyncio.Future(loop=self.loop)
         fut.set_result(result)
         return fut
+
+    def patch_session(self):
+        patcher = patch('aiohttp.ClientSession')
+        self.addCleanup(patcher.stop)
+        self.session_class = patcher.start()
+        return self.session_class.return_value
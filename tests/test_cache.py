@@ -0,0 +1,102 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+import tempfile
+import shutil
+import os
+
+from validator import cache, parsers
+
+
+class TestParseCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _parser(self):
+        parser = MagicMock()
+        parser.parse.side_effect = lambda content: content.upper()
+        return parser
+
+    def test_parse_once_between_runs(self):
+        parser = self._parser()
+
+        cache.CachedParser(parser, cache.ParseCache(self.directory)).parse('aaa')
+        actual = cache.CachedParser(parser, cache.ParseCache(self.directory)).parse('aaa')
+
+        self.assertEqual('AAA', actual)
+        self.assertEqual(1, parser.parse.call_count)
+
+    def test_key_depends_on_parser_config(self):
+        parse_cache = cache.ParseCache(self.directory)
+
+        key1 = parse_cache.key(parsers.XmlParser('.//string'), 'aaa')
+        key2 = parse_cache.key(parsers.XmlParser('.//plurals'), 'aaa')
+
+        self.assertNotEqual(key1, key2)
+
+    def test_evict_over_max_size(self):
+        parse_cache = cache.ParseCache(self.directory, max_size=1000)
+        parser = cache.CachedParser(self._parser(), parse_cache)
+
+        for i in range(20):
+            parser.parse('%s %s' % (i, 'a' * 100))
+
+        size = sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(self.directory) for name in names)
+        self.assertLessEqual(size, 1000)
+
+
+class TestUrlCache(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'urls.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_shared_between_connections(self):
+        url_cache = cache.UrlCache(self.path)
+        url_cache.set_many({'http://a.com': 200, 'http://b.com': 404})
+        url_cache.close()
+
+        actual = cache.UrlCache(self.path).get_many(['http://a.com', 'http://b.com', 'http://c.com'])
+
+        self.assertEqual({'http://a.com': 200, 'http://b.com': 404}, actual)
+
+    def test_expired_by_status(self):
+        url_cache = cache.UrlCache(self.path, ttls=((200, 300, 3600), (500, 600, -1)))
+        url_cache.set_many({'http://a.com': 200, 'http://b.com': 500})
+
+        self.assertEqual({'http://a.com': 200}, url_cache.get_many(['http://a.com', 'http://b.com']))
+
+
+class TestUrlCassette(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'urls.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_replay_saved_statuses(self):
+        cassette = cache.UrlCassette(self.path)
+        cassette.set_many({'http://a.com': 200, 'http://b.com': 404})
+        cassette.save()
+
+        actual = cache.UrlCassette(self.path).get_many(['http://a.com', 'http://b.com', 'http://c.com'])
+
+        self.assertEqual({'http://a.com': 200, 'http://b.com': 404}, actual)
+
+    def test_record_merges(self):
+        cassette = cache.UrlCassette(self.path)
+        cassette.set_many({'http://a.com': 200})
+        cassette.save()
+        cassette = cache.UrlCassette(self.path)
+        cassette.set_many({'http://b.com': 404})
+        cassette.save()
+
+        actual = cache.UrlCassette(self.path).get_many(['http://a.com', 'http://b.com'])
+
+        self.assertEqual({'http://a.com': 200, 'http://b.com': 404}, actual)
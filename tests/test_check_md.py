@@ -1,5 +1,5 @@
 from unittest import TestCase, skip
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 
 from validator.checks import md
 
@@ -36,7 +36,43 @@ class TestMarkdownComparator(TestCase):
         self.assertEqual('dummy_path2', diff.other.original)
         self.assertNotEqual([], diff.error_msgs)
 
+    def test_diff_rows_as_they_are_read(self):
+        events = []
+        self.parser.parse.side_effect = lambda val: val
+
+        def read_path(path):
+            events.append(('read', path))
+            return path
+
+        def rows():
+            yield ['en1', 'de1']
+            yield ['en2', 'de2']
+
+        self.reader.read.side_effect = read_path
+        with patch.object(md, '_diff', lambda contents: events.append(('diff', contents)) or ('', '', [])):
+            self.check.check(rows(), self.parser, self.reader)
+
+        self.assertEqual([('read', 'en1'), ('read', 'de1'), ('diff', ('en1', 'de1')),
+                          ('read', 'en2'), ('read', 'de2'), ('diff', ('en2', 'de2'))], events)
+
     @skip('not working')
     def test_markdown_broken_url(self):
         diffs = self._test_markdown('tests/fixtures/lang/en/test3.md', 'tests/fixtures/lang/de/test3.md')
         self.assertEqual(1, len(diffs))
+
+
+class TestParallelMarkdownComparator(TestCase):
+    def test_same_errors_as_serial(self):
+        parser = MagicMock()
+        parser.parse.side_effect = lambda val: val
+        reader = MagicMock()
+        reader.read.side_effect = read
+        data = [['tests/fixtures/lang/en/test1.md', 'tests/fixtures/lang/de/test1.md'],
+                ['tests/fixtures/lang/en/test2.md', 'tests/fixtures/lang/de/test2.md',
+                 'tests/fixtures/lang/en/test1.md']]
+
+        serial = md.MarkdownComparator().check(data, parser, reader)
+        parallel = md.MarkdownComparator(jobs=2).check(data, parser, reader)
+
+        self.assertEqual([(e.base.original, e.other.original, e.error_msgs) for e in serial],
+                         [(e.base.original, e.other.original, e.error_msgs) for e in parallel])
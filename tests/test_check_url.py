@@ -1,7 +1,15 @@
-from unittest.mock import patch, MagicMock
+from unittest.mock import MagicMock, patch
+import asyncio
+import time
+import aiohttp
+from aiohttp import web
+from collections import defaultdict
+import tempfile
+import os
 from . import AsyncTestCase
 
 from validator.checks import url
+from validator.errors import UrlDiff
 
 
 class TestTxtExtractor(AsyncTestCase):
@@ -26,32 +34,207 @@ class TestTxtExtractor(AsyncTestCase):
         actual = list(self.extractor.extract_urls('aaa http://www.{{param}}.com aaa'))
         self.assertEqual([], actual)
 
+    def test_unclosed_paren(self):
+        actual = list(self.extractor.extract_urls('aaa http://www.google.com/(' + 'a' * 10000 + ' aaa'))
+        self.assertEqual(['http://www.google.com/'], actual)
+
+
+class TestRetryPolicy(AsyncTestCase):
+    def test_retry_statuses(self):
+        policy = url.RetryPolicy(max_count=3)
+
+        self.assertTrue(policy.retry(503, 1))
+        self.assertFalse(policy.retry(503, 3))
+        self.assertFalse(policy.retry(404, 1))
+
+    def test_exponential_backoff(self):
+        policy = url.RetryPolicy(backoff=1, max_backoff=3, jitter=False)
+
+        self.assertEqual([1, 2, 3], [policy.delay(attempt) for attempt in (1, 2, 3)])
+
+    def test_jitter(self):
+        policy = url.RetryPolicy(backoff=2)
+
+        self.assertTrue(all(1 <= policy.delay(1) <= 2 for _ in range(20)))
+
+    def test_retry_after(self):
+        policy = url.RetryPolicy(max_retry_after=10)
+
+        self.assertEqual(5, policy.delay(1, url._retry_after('5')))
+        self.assertEqual(10, policy.delay(1, url._retry_after('120')))
+        self.assertEqual(0, url._retry_after('Wed, 21 Oct 2015 07:28:00 GMT'))
+        self.assertIsNone(url._retry_after('soon'))
+
+
+class TestHostScheduler(AsyncTestCase):
+    def test_concurrency(self):
+        scheduler = url.HostScheduler(concurrency=1)
+
+        self.assertEqual(0, scheduler.reserve('a.com', 0))
+        self.assertIsNone(scheduler.reserve('a.com', 0))
+        self.assertEqual(0, scheduler.reserve('b.com', 0))
+
+    def test_release_parked(self):
+        scheduler = url.HostScheduler(concurrency=1)
+        scheduler.reserve('a.com', 0)
+        scheduler.park('a.com', 'item')
+
+        self.assertEqual((None, None), scheduler.ready('a.com', 0))
+        scheduler.release('a.com')
+        self.assertEqual(('item', None), scheduler.ready('a.com', 0))
+        self.assertEqual((None, None), scheduler.ready('a.com', 0))
+
+    def test_single_wake_up_when_rate_limited(self):
+        scheduler = url.HostScheduler(concurrency=10, rate=2)
+        scheduler.reserve('a.com', 0)
+        scheduler.park('a.com', 'first')
+        scheduler.park('a.com', 'second')
+
+        self.assertEqual((None, 0.5), scheduler.ready('a.com', 0))
+        self.assertEqual((None, None), scheduler.ready('a.com', 0))
+        scheduler.woken('a.com')
+        self.assertEqual(('first', None), scheduler.ready('a.com', 0.5))
+
+    def test_rate(self):
+        scheduler = url.HostScheduler(concurrency=10, rate=2)
+        scheduler.reserve('a.com', 0)
+
+        self.assertEqual(0.5, scheduler.reserve('a.com', 0))
+        self.assertEqual(0, scheduler.reserve('a.com', 0.5))
+
+    def test_interleave(self):
+        urls = ['http://a.com/1', 'http://a.com/2', 'http://a.com/3', 'http://b.com/1']
+
+        actual = [u for _, u in url._interleave(urls)]
+        self.assertEqual(['http://a.com/1', 'http://b.com/1', 'http://a.com/2', 'http://a.com/3'], actual)
+
+
+class TestUrlCanonicalizer(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.canonicalizer = url.UrlCanonicalizer()
+
+    def test_equivalent_urls(self):
+        urls = [
+            'http://www.google.com',
+            'http://www.google.com#top',
+            'HTTP://WWW.Google.com',
+            'http://www.google.com:80',
+            'http://www.google.com?utm_source=mail&fbclid=123',
+        ]
+
+        self.assertEqual({'http://www.google.com'}, set(map(self.canonicalizer.canonical, urls)))
+
+    def test_keep_trailing_slash(self):
+        self.assertEqual('http://google.com/docs/', self.canonicalizer.canonical('http://google.com/docs/'))
+
+    def test_trailing_slash(self):
+        canonicalizer = url.UrlCanonicalizer(rules=url.CANONICAL_RULES)
+
+        self.assertEqual('http://google.com/docs', canonicalizer.canonical('http://google.com/docs/'))
+
+    def test_keep_other_params(self):
+        actual = self.canonicalizer.canonical('https://google.com:443/search?utm_medium=x&q=Test&page=2')
+
+        self.assertEqual('https://google.com/search?q=Test&page=2', actual)
+
+    def test_keep_path_case_and_other_ports(self):
+        actual = self.canonicalizer.canonical('http://Google.com:8080/Path/')
+
+        self.assertEqual('http://google.com:8080/Path/', actual)
+
+    def test_selected_rules(self):
+        canonicalizer = url.UrlCanonicalizer(rules=('fragment', ))
+
+        self.assertEqual('http://Google.com/', canonicalizer.canonical('http://Google.com/#top'))
+
+    def test_unknown_rule(self):
+        with self.assertRaises(ValueError):
+            url.UrlCanonicalizer(rules=('www', ))
+
+
+class TestCircuitBreaker(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.breaker = url.CircuitBreaker(threshold=2, reset_timeout=10)
+
+    def test_open_after_consecutive_failures(self):
+        self.breaker.failure('a.com', 0)
+        self.assertTrue(self.breaker.allow('a.com', 0))
+        self.breaker.failure('a.com', 0)
+
+        self.assertFalse(self.breaker.allow('a.com', 1))
+        self.assertTrue(self.breaker.allow('b.com', 1))
+
+    def test_success_resets_failures(self):
+        self.breaker.failure('a.com', 0)
+        self.breaker.success('a.com')
+        self.breaker.failure('a.com', 0)
+
+        self.assertTrue(self.breaker.allow('a.com', 0))
+
+    def test_half_open_probe(self):
+        self.breaker.failure('a.com', 0)
+        self.breaker.failure('a.com', 0)
+
+        self.assertTrue(self.breaker.allow('a.com', 10))
+        self.assertFalse(self.breaker.allow('a.com', 10))
+        self.breaker.success('a.com')
+        self.assertTrue(self.breaker.allow('a.com', 10))
+
+    def test_failed_probe_opens_again(self):
+        self.breaker.failure('a.com', 0)
+        self.breaker.failure('a.com', 0)
+        self.breaker.allow('a.com', 10)
+        self.breaker.failure('a.com', 10)
+
+        self.assertFalse(self.breaker.allow('a.com', 15))
+        self.assertTrue(self.breaker.allow('a.com', 20))
+
+    def test_cancelled_probe(self):
+        self.breaker.failure('a.com', 0)
+        self.breaker.failure('a.com', 0)
+        self.breaker.allow('a.com', 10)
+        self.breaker.cancel('a.com')
+
+        self.assertTrue(self.breaker.allow('a.com', 10))
+
 
 class TestTxt(AsyncTestCase):
     def setUp(self):
         super().setUp()
+        self.request = self.patch_session().request
         self.headers = {'User-Agent': 'test'}
         self.check = url.UrlValidator('txt', headers=self.headers)
         self.parser = MagicMock()
         self.reader = MagicMock()
 
-    def _check(self, mock_get, content, status_code):
+    def _check(self, content, status_code):
         self.parser.parse.return_value = content
         res = MagicMock()
         res.status = status_code
-        mock_get.return_value = self.make_fut(res)
+        self.request.return_value = self.make_fut(res)
 
         return self.check.check([['dummy_path']], self.parser, self.reader)
 
-    @patch('aiohttp.request')
-    def test_happy_path(self, mock_get):
-        invalid_urls = self._check(mock_get, 'aaa http://www.google.com aaa', 200)
+    def _check_by_method(self, content, status_codes):
+        self.parser.parse.return_value = content
+
+        def request(method, *args, **kwargs):
+            res = MagicMock()
+            res.status = status_codes[method]
+            return self.make_fut(res)
+
+        self.request.side_effect = request
+        return self.check.check([['dummy_path']], self.parser, self.reader)
+
+    def test_happy_path(self):
+        invalid_urls = self._check('aaa http://www.google.com aaa', 200)
 
         self.assertEqual([], invalid_urls)
 
-    @patch('aiohttp.request')
-    def test_not_found(self, mock_get):
-        invalid_urls = self._check(mock_get, 'aaa http://www.google.com aaa', 404)
+    def test_not_found(self):
+        invalid_urls = self._check('aaa http://www.google.com aaa', 404)
 
         self.assertEqual(1, len(invalid_urls))
         url = invalid_urls[0]
@@ -59,159 +242,503 @@ class TestTxt(AsyncTestCase):
         self.assertEqual(['dummy_path'], url.files)
         self.assertEqual(404, url.status_code)
 
-    @patch('aiohttp.request')
-    def test_retry_for_server_error(self, mock_get):
-        self._check(mock_get, 'aaa http://www.google.com aaa', 500)
+    def test_retry_for_server_error(self):
+        self.check = url.UrlValidator('txt', headers=self.headers, retry_policy=url.RetryPolicy(backoff=0))
+        self._check('aaa http://www.google.com aaa', 500)
+
+        self.assertEqual(3, self.request.call_count)
+
+    def test_retry_too_many_requests(self):
+        self.check = url.UrlValidator('txt', headers=self.headers, retry_policy=url.RetryPolicy(backoff=0))
+        statuses = [429, 200]
+
+        def request(method, *args, **kwargs):
+            res = MagicMock()
+            res.status = statuses.pop(0)
+            res.headers = {'Retry-After': '0'}
+            return self.make_fut(res)
+
+        self.request.side_effect = request
+        self.parser.parse.return_value = 'aaa http://www.google.com aaa'
+        invalid_urls = self.check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual([], invalid_urls)
+        self.assertEqual(2, self.request.call_count)
+
+    def test_no_retry_for_not_found(self):
+        self._check('aaa http://www.google.com aaa', 404)
+
+        methods = [call[0][0] for call in self.request.call_args_list]
+        self.assertEqual(['head', 'get'], methods)
+
+    def test_head_release_not_iterable(self):
+        class Noop(object):
+            def __await__(self):
+                return iter(())
+
+        self.parser.parse.return_value = 'aaa http://www.google.com aaa'
+        res = MagicMock()
+        res.status = 200
+        res.release.return_value = Noop()
+        self.request.return_value = self.make_fut(res)
+
+        invalid_urls = self.check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual([], invalid_urls)
+        self.assertEqual(['head'], [call[0][0] for call in self.request.call_args_list])
+
+    def test_make_only_one_request_per_unique_url(self):
+        self._check('aaa http://www.google.com aaa http://www.google.com aaa', 200)
+
+        self.assertEqual(1, self.request.call_count)
+
+    def test_one_request_per_canonical_url(self):
+        contents = {
+            'first': 'aaa http://www.google.com/#top aaa',
+            'second': 'aaa http://WWW.google.com/?utm_source=x aaa',
+        }
+        self.reader.read.side_effect = lambda path: path
+        self.parser.parse.side_effect = lambda path: contents[path]
+        res = MagicMock()
+        res.status = 404
+        self.request.return_value = self.make_fut(res)
+
+        invalid_urls = self.check.check([['first', 'second']], self.parser, self.reader)
+
+        self.assertEqual(1, len(invalid_urls))
+        self.assertEqual('http://www.google.com/#top', invalid_urls[0].url)
+        self.assertEqual(['first', 'second'], sorted(invalid_urls[0].files))
+        self.assertEqual('http://www.google.com/#top', self.request.call_args[0][1])
+        self.assertEqual(['head', 'get'], [call[0][0] for call in self.request.call_args_list])
+
+    def test_one_session_per_check(self):
+        self._check('aaa http://www.google.com aaa http://www.bing.com aaa', 200)
+
+        self.assertEqual(1, self.session_class.call_count)
+        self.assertEqual(2, self.request.call_count)
+
+    def test_bounded_concurrency(self):
+        state = {'active': 0, 'max': 0}
+        res = MagicMock()
+        res.status = 200
+
+        @asyncio.coroutine
+        def request(*args, **kwargs):
+            state['active'] = state['active'] + 1
+            state['max'] = max(state['max'], state['active'])
+            yield from asyncio.sleep(0)
+            state['active'] = state['active'] - 1
+            return res
+
+        self.request.side_effect = request
+        self.parser.parse.return_value = ' '.join('http://www.google.com/%s' % i for i in range(10))
+        check = url.UrlValidator('txt', headers=self.headers, concurrency=3)
+        check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual(3, state['max'])
+        self.assertEqual(10, check.checker.stats.count)
+
+    def test_host_concurrency(self):
+        state = {'active': defaultdict(int), 'max': defaultdict(int)}
+        res = MagicMock()
+        res.status = 200
+
+        @asyncio.coroutine
+        def request(method, request_url, **kwargs):
+            host = request_url.split('/')[2]
+            state['active'][host] = state['active'][host] + 1
+            state['max'][host] = max(state['max'][host], state['active'][host])
+            yield from asyncio.sleep(0)
+            state['active'][host] = state['active'][host] - 1
+            return res
+
+        self.request.side_effect = request
+        urls = ['http://%s.com/%s' % (host, i) for host in ('a', 'b') for i in range(6)]
+        self.parser.parse.return_value = ' '.join(urls)
+        check = url.UrlValidator('txt', headers=self.headers, concurrency=6, host_concurrency=2)
+        check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual({'a.com': 2, 'b.com': 2}, dict(state['max']))
+        self.assertEqual(12, self.request.call_count)
+
+    def test_request_timeouts(self):
+        check = url.UrlValidator('txt', headers=self.headers, connect_timeout=1, read_timeout=2)
+        self.check = check
+        self._check('aaa http://www.google.com aaa', 200)
+
+        timeout = self.session_class.call_args[1]['timeout']
+        self.assertEqual((1, 2), (timeout.connect, timeout.sock_read))
+
+    def test_timeout_skips_get(self):
+        self.request.side_effect = asyncio.TimeoutError()
+        self.parser.parse.return_value = 'aaa http://www.google.com aaa'
+        check = url.UrlValidator('txt', headers=self.headers, retry_policy=url.RetryPolicy(max_count=1))
+        invalid_urls = check.check([['dummy_path']], self.parser, self.reader)
+
+        self.request.assert_called_once_with('head', 'http://www.google.com', headers=self.headers)
+        self.assertEqual(500, invalid_urls[0].status_code)
+
+    def test_budget_reports_unchecked(self):
+        res = MagicMock()
+        res.status = 200
+
+        @asyncio.coroutine
+        def request(method, request_url, **kwargs):
+            if 'slow' in request_url:
+                yield from asyncio.sleep(10)
+            return res
+
+        self.request.side_effect = request
+        self.parser.parse.return_value = 'aaa http://slow.com aaa http://fast.com aaa'
+        check = url.UrlValidator('txt', headers=self.headers, budget=0.05)
+        invalid_urls = check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual(['http://slow.com'], [u.url for u in invalid_urls])
+        self.assertEqual(url.UNCHECKED, invalid_urls[0].reason)
+        self.assertEqual('was unchecked', invalid_urls[0].status())
+
+    def test_skip_unavailable_host(self):
+        self.request.side_effect = aiohttp.ClientConnectionError()
+        self.parser.parse.return_value = ' '.join('http://down.com/%s' % i for i in range(10))
+        check = url.UrlValidator('txt', headers=self.headers, concurrency=1, breaker_threshold=2,
+                                 retry_policy=url.RetryPolicy(max_count=1))
+        invalid_urls = check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual(4, self.request.call_count)
+        self.assertEqual(10, len(invalid_urls))
+        reasons = [u.reason for u in invalid_urls]
+        self.assertEqual(8, reasons.count(url.HOST_UNAVAILABLE))
+
+    def test_rate_limited_host(self):
+        res = MagicMock()
+        res.status = 200
+        self.request.return_value = self.make_fut(res)
+        self.parser.parse.return_value = ' '.join('http://www.google.com/%s' % i for i in range(20))
+        check = url.UrlValidator('txt', headers=self.headers, host_rate=500)
+        reserve = url.HostScheduler.reserve
+        calls = []
+
+        def counted_reserve(scheduler, host, now):
+            calls.append(host)
+            return reserve(scheduler, host, now)
+
+        with patch.object(url.HostScheduler, 'reserve', counted_reserve):
+            invalid_urls = check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual([], invalid_urls)
+        self.assertEqual(20, self.request.call_count)
+        self.assertLessEqual(len(calls), 40)
+
+    def test_skip_unavailable_rate_limited_host(self):
+        self.request.side_effect = aiohttp.ClientConnectionError()
+        self.parser.parse.return_value = ' '.join('http://down.com/%s' % i for i in range(12))
+        check = url.UrlValidator('txt', headers=self.headers, host_rate=4, breaker_threshold=1,
+                                 retry_policy=url.RetryPolicy(max_count=1))
+        started = time.monotonic()
+        invalid_urls = check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertEqual(2, self.request.call_count)
+        self.assertEqual(11, [u.reason for u in invalid_urls].count(url.HOST_UNAVAILABLE))
+
+    def test_invalid_urls_keep_host_available(self):
+        self.request.side_effect = aiohttp.InvalidURL('http://down.com')
+        self.parser.parse.return_value = ' '.join('http://down.com/%s' % i for i in range(4))
+        check = url.UrlValidator('txt', headers=self.headers, concurrency=1, breaker_threshold=2,
+                                 retry_policy=url.RetryPolicy(max_count=1))
+        invalid_urls = check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual([None] * 4, [u.reason for u in invalid_urls])
+        self.assertEqual(8, self.request.call_count)
+
+    def test_probe_failed_with_invalid_url(self):
+        res = MagicMock()
+        res.status = 200
+        errors = [aiohttp.ClientConnectionError(), aiohttp.InvalidURL('')]
+        failing = {}
+
+        def request(method, request_url, **kwargs):
+            if request_url not in failing:
+                failing[request_url] = errors.pop(0) if errors else None
+            if failing[request_url] is not None:
+                raise failing[request_url]
+            return self.make_fut(res)
+
+        self.request.side_effect = request
+        self.parser.parse.return_value = ' '.join('http://down.com/%s' % i for i in range(4))
+        check = url.UrlValidator('txt', headers=self.headers, concurrency=1, breaker_threshold=1, breaker_reset=0,
+                                 retry_policy=url.RetryPolicy(max_count=1))
+        invalid_urls = check.check([['dummy_path']], self.parser, self.reader)
+
+        self.assertEqual(4, len(failing))
+        self.assertEqual([None, None], [u.reason for u in invalid_urls])
+
+    def test_cached_status(self):
+        with tempfile.TemporaryDirectory() as directory:
+            check = url.UrlValidator('txt', headers=self.headers, cache=os.path.join(directory, 'urls.sqlite'))
+            self.check = check
+            self._check('aaa http://www.google.com aaa', 404)
+            self.request.reset_mock()
+            invalid_urls = self._check('aaa http://www.google.com aaa', 200)
+
+        self.assertFalse(self.request.called)
+        self.assertEqual(404, invalid_urls[0].status_code)
+
+    def test_replay_recorded_statuses(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'urls.json')
+            self.check = url.UrlValidator('txt', headers=self.headers, cassette=path, cassette_mode='record')
+            self._check('aaa http://www.google.com aaa', 404)
+            self.session_class.reset_mock()
+            self.check = url.UrlValidator('txt', headers=self.headers, cassette=path)
+            invalid_urls = self._check('aaa http://www.google.com aaa http://www.bing.com aaa', 200)
+
+        self.assertFalse(self.session_class.called)
+        actual = {u.url: u.status() for u in invalid_urls}
+        self.assertEqual({'http://www.google.com': 'returned with code 404', 'http://www.bing.com': 'was not recorded'},
+                         actual)
+
+    def test_record_only_statuses(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'urls.json')
+            self.request.side_effect = aiohttp.ClientConnectionError()
+            self.parser.parse.return_value = ' '.join('http://down.com/%s' % i for i in range(3))
+            check = url.UrlValidator('txt', headers=self.headers, concurrency=1, breaker_threshold=1,
+                                     retry_policy=url.RetryPolicy(max_count=1), cassette=path, cassette_mode='record')
+            check.check([['dummy_path']], self.parser, self.reader)
+            self.check = url.UrlValidator('txt', headers=self.headers, cassette=path)
+            invalid_urls = self.check.check([['dummy_path']], self.parser, self.reader)
+
+        reasons = sorted(str(u.reason) for u in invalid_urls)
+        self.assertEqual(['None', url.NOT_RECORDED, url.NOT_RECORDED], reasons)
+
+    def test_unknown_cassette_mode(self):
+        with self.assertRaises(ValueError):
+            url.UrlValidator('txt', cassette='urls.json', cassette_mode='rewind')
 
-        self.assertEqual(3, mock_get.call_count)
+    def test_unknown_option(self):
+        with self.assertRaises(TypeError):
+            url.UrlValidator('txt', concurency=3)
 
-    @patch('aiohttp.request')
-    def test_make_only_one_request_per_unique_url(self, mock_get):
-        self._check(mock_get, 'aaa http://www.google.com aaa http://www.google.com aaa', 200)
+    def test_extractor_options_not_passed_to_checker(self):
+        check = url.UrlValidator('html', root_url='http://a.com', skip_images=True, concurrency=3)
 
-        self.assertEqual(1, mock_get.call_count)
+        self.assertEqual({'concurrency': 3}, check.checker_options)
+        self.assertEqual('http://a.com', check.extractor.root_url)
+        with self.assertRaises(TypeError):
+            url.UrlValidator('txt', skip_images=True)
 
-    @patch('aiohttp.request')
-    def test_skip_parameterized_urls_in_middle(self, mock_get):
-        self._check(mock_get, 'aaa http://domain.com/{{param}} aaa', 200)
+    def test_get_when_head_rejected(self):
+        self._check_by_method('aaa http://www.google.com/1 aaa http://www.google.com/2 aaa', {'head': 405, 'get': 200})
 
-        self.assertFalse(mock_get.called)
+        methods = [call[0][0] for call in self.request.call_args_list]
+        self.assertEqual(['head', 'get', 'get'], methods)
 
-    @patch('aiohttp.request')
-    def test_skip_parameterized_urls_from_start(self, mock_get):
-        self._check(mock_get, 'aaa http://{{ticket.url}}, aaa', 200)
+    def test_head_after_failed_head(self):
+        responses = [aiohttp.ClientPayloadError(), 200, 200]
 
-        self.assertFalse(mock_get.called)
+        def request(method, *args, **kwargs):
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            res = MagicMock()
+            res.status = response
+            return self.make_fut(res)
 
-    @patch('aiohttp.request')
-    def test_include_params_in_the_url(self, mock_get):
-        self._check(mock_get, 'aaa http://domain.com/hello?id=123 aaa', 200)
+        self.request.side_effect = request
+        checker = url.UrlStatusChecker(headers=self.headers)
+        checker.check([url.UrlDiff('http://www.google.com/1')])
+        checker.check([url.UrlDiff('http://www.google.com/2')])
 
-        mock_get.assert_called_with('get', 'http://domain.com/hello?id=123', headers=self.headers)
+        methods = [call[0][0] for call in self.request.call_args_list]
+        self.assertEqual(['head', 'get', 'head'], methods)
 
-    @patch('aiohttp.request')
-    def test_skip_empty_urls(self, mock_get):
-        self._check(mock_get, 'aaa http:// aaa', 200)
+    def test_no_get_when_head_accepted(self):
+        self._check_by_method('aaa http://www.google.com aaa', {'head': 200, 'get': 200})
 
-        self.assertFalse(mock_get.called)
+        self.request.assert_called_once_with('head', 'http://www.google.com', headers=self.headers)
 
-    @patch('aiohttp.request')
-    def test_skip_email(self, mock_get):
-        self._check(mock_get, 'aaa support@getkeepsafe.com aaa', 200)
+    def test_skip_parameterized_urls_in_middle(self):
+        self._check('aaa http://domain.com/{{param}} aaa', 200)
 
-        self.assertFalse(mock_get.called)
+        self.assertFalse(self.request.called)
 
-    @patch('aiohttp.request')
-    def test_skip_commas(self, mock_get):
-        self._check(mock_get, 'aaa http://{{ticket.url}}, aaa', 404)
+    def test_skip_parameterized_urls_from_start(self):
+        self._check('aaa http://{{ticket.url}}, aaa', 200)
 
-        self.assertFalse(mock_get.called)
+        self.assertFalse(self.request.called)
 
-    @patch('aiohttp.request')
-    def test_skip_commas_url(self, mock_get):
-        self._check(mock_get, 'aaa http://www.google.com, aaa', 200)
+    def test_include_params_in_the_url(self):
+        self._check('aaa http://domain.com/hello?id=123 aaa', 200)
 
-        mock_get.assert_called_with('get', 'http://www.google.com', headers=self.headers)
+        self.request.assert_called_with('head', 'http://domain.com/hello?id=123', headers=self.headers)
 
-    @patch('aiohttp.request')
-    def test_skip_chineese_commas(self, mock_get):
-        self._check(mock_get, 'aaa http://bit.ly/UpdateKeepSafe。拥有最新版本就能解决大部分问题了。 aaa', 200)
+    def test_skip_empty_urls(self):
+        self._check('aaa http:// aaa', 200)
 
-        mock_get.assert_called_with('get', 'http://bit.ly/UpdateKeepSafe', headers=self.headers)
+        self.assertFalse(self.request.called)
 
-    @patch('aiohttp.request')
-    def test_skip_keepsafe_urls(self, mock_get):
-        self._check(mock_get, 'aaa keepsafe://access.getkeepsafe.com/upgrade/email-premium-hint aaa', 200)
+    def test_skip_email(self):
+        self._check('aaa support@getkeepsafe.com aaa', 200)
 
-        self.assertFalse(mock_get.called)
+        self.assertFalse(self.request.called)
 
-    @patch('aiohttp.request')
-    def test_check_headers(self, mock_get):
+    def test_skip_commas(self):
+        self._check('aaa http://{{ticket.url}}, aaa', 404)
+
+        self.assertFalse(self.request.called)
+
+    def test_skip_commas_url(self):
+        self._check('aaa http://www.google.com, aaa', 200)
+
+        self.request.assert_called_with('head', 'http://www.google.com', headers=self.headers)
+
+    def test_skip_chineese_commas(self):
+        self._check('aaa http://bit.ly/UpdateKeepSafe。拥有最新版本就能解决大部分问题了。 aaa', 200)
+
+        self.request.assert_called_with('head', 'http://bit.ly/UpdateKeepSafe', headers=self.headers)
+
+    def test_skip_keepsafe_urls(self):
+        self._check('aaa keepsafe://access.getkeepsafe.com/upgrade/email-premium-hint aaa', 200)
+
+        self.assertFalse(self.request.called)
+
+    def test_check_headers(self):
         self.check = url.UrlValidator('txt', headers=self.headers)
-        self._check(mock_get, 'aaa http://www.google.com, aaa', 200)
+        self._check('aaa http://www.google.com, aaa', 200)
+
+        self.request.assert_called_with('head', 'http://www.google.com', headers=self.headers)
+
+
+class TestLocalServer(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.methods = []
+        app = web.Application()
+        app.router.add_route('*', '/{status:\\d+}', self.handle)
+        self.runner = web.AppRunner(app)
+        self.coro(self.runner.setup())
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        self.coro(site.start())
+        self.port = self.runner.addresses[0][1]
+
+    def tearDown(self):
+        self.coro(self.runner.cleanup())
+        super().tearDown()
+
+    @asyncio.coroutine
+    def handle(self, request):
+        self.methods.append(request.method)
+        return web.Response(status=int(request.match_info['status']), body=b'x' * 1024)
+
+    @asyncio.coroutine
+    def _check(self, checker, urls):
+        return (yield from checker.async_check([UrlDiff(u) for u in urls]))
 
-        mock_get.assert_called_with('get', 'http://www.google.com', headers=self.headers)
+    def test_head_requests(self):
+        urls = ['http://127.0.0.1:%d/200' % self.port, 'http://127.0.0.1:%d/201' % self.port]
+
+        invalid_urls = self.coro(self._check(url.UrlStatusChecker(), urls))
+
+        self.assertEqual([], invalid_urls)
+        self.assertEqual(['HEAD', 'HEAD'], self.methods)
+
+    def test_get_when_head_rejected(self):
+        invalid_urls = self.coro(self._check(url.UrlStatusChecker(), ['http://127.0.0.1:%d/404' % self.port]))
+
+        self.assertEqual([404], [u.status_code for u in invalid_urls])
+        self.assertEqual(['HEAD', 'GET'], self.methods)
 
 
 class TestHtml(AsyncTestCase):
     def setUp(self):
         super().setUp()
+        self.request = self.patch_session().request
         self.headers = {'User-Agent': 'test'}
         self.check = url.UrlValidator('html', headers=self.headers)
         self.parser = MagicMock()
         self.reader = MagicMock()
 
-    def _check(self, mock_get, content, status_code, check=None):
+    def _check(self, content, status_code, check=None):
         check = check or self.check
         self.parser.parse.return_value = content
         res = MagicMock()
         res.status = status_code
-        mock_get.return_value = self.make_fut(res)
+        self.request.return_value = self.make_fut(res)
 
         return check.check(['dummy_path'], self.parser, self.reader)
 
-    @patch('aiohttp.request')
-    def test_happy_path(self, mock_get):
-        errors = self._check(mock_get, '<a href="http://www.google.com">link</a>', 200)
+    def test_happy_path(self):
+        errors = self._check('<a href="http://www.google.com">link</a>', 200)
 
-        mock_get.assert_called_with('get', 'http://www.google.com', headers=self.headers)
+        self.request.assert_called_with('head', 'http://www.google.com', headers=self.headers)
         self.assertEqual([], errors)
 
-    @patch('aiohttp.request')
-    def test_url_in_text_no_href(self, mock_get):
-        errors = self._check(mock_get, '<a>http://www.google.com</a>', 200)
+    def test_url_in_text_no_href(self):
+        errors = self._check('<a>http://www.google.com</a>', 200)
 
         self.assertEqual([], errors)
 
-    @patch('aiohttp.request')
-    def test_url_with_unaccepted_chars(self, mock_get):
-        errors = self._check(mock_get, '<a>http://www.google.com/\u200e?asd</a>', 200)
+    def test_url_with_unaccepted_chars(self):
+        errors = self._check('<a>http://www.google.com/\u200e?asd</a>', 200)
 
         self.assertEqual(1, len(errors))
         self.assertEqual(True, errors[0].has_disallowed_chars)
 
-    @patch('aiohttp.request')
-    def test_add_http_if_missing(self, mock_get):
-        errors = self._check(mock_get, '<a href="www.google.com">link</a>', 200)
+    def test_add_http_if_missing(self):
+        errors = self._check('<a href="www.google.com">link</a>', 200)
 
         self.assertEqual([], errors)
 
-    @patch('aiohttp.request')
-    def test_image(self, mock_get):
-        self._check(mock_get, '<img src="http://www.google.com">', 200)
+    def test_image(self):
+        self._check('<img src="http://www.google.com">', 200)
+
+        self.assertTrue(self.request.called)
+
+    def test_skip_request_parameterized_urls(self):
+        self._check('<a href="{{url}}">link</a>', 200)
 
-        self.assertTrue(mock_get.called)
+        self.assertFalse(self.request.called)
+
+    def test_skip_empty_urls(self):
+        self._check('<a href=""></a>', 200)
+
+        self.assertFalse(self.request.called)
+
+    def test_skip_email(self):
+        self._check('<a href="support@getkeepsafe.com"></a>', 200)
+
+        self.assertFalse(self.request.called)
+
+    def test_skip_keepsafe_urls(self):
+        errors = self._check('<a href="keepsafe://access.getkeepsafe.com/upgrade/email-premium-hint"></a>', 200)
+
+        self.assertFalse(self.request.called)
+        self.assertEqual([], errors)
 
-    @patch('aiohttp.request')
-    def test_skip_request_parameterized_urls(self, mock_get):
-        self._check(mock_get, '<a href="{{url}}">link</a>', 200)
+    def test_url_in_nested_text(self):
+        self._check('<a><b>http://www.google.com</b>/search</a>', 200)
 
-        self.assertFalse(mock_get.called)
+        self.request.assert_called_with('head', 'http://www.google.com/search', headers=self.headers)
 
-    @patch('aiohttp.request')
-    def test_skip_empty_urls(self, mock_get):
-        self._check(mock_get, '<a href=""></a>', 200)
+    def test_unescape_href(self):
+        self._check('<a href="http://www.google.com/search?a=1&amp;b=2">link</a>', 200)
 
-        self.assertFalse(mock_get.called)
+        self.request.assert_called_with('head', 'http://www.google.com/search?a=1&b=2', headers=self.headers)
 
-    @patch('aiohttp.request')
-    def test_skip_email(self, mock_get):
-        self._check(mock_get, '<a href="support@getkeepsafe.com"></a>', 200)
+    def test_unclosed_anchor(self):
+        self._check('<p><a>http://www.google.com</p>', 200)
 
-        self.assertFalse(mock_get.called)
+        self.request.assert_called_with('head', 'http://www.google.com', headers=self.headers)
 
-    @patch('aiohttp.request')
-    def test_skip_keepsafe_urls(self, mock_get):
-        errors = self._check(mock_get,
-                             '<a href="keepsafe://access.getkeepsafe.com/upgrade/email-premium-hint"></a>',
-                             200)
+    def test_image_without_src(self):
+        errors = self._check('<img alt="image" />', 200)
 
-        self.assertFalse(mock_get.called)
+        self.assertFalse(self.request.called)
         self.assertEqual([], errors)
 
-    @patch('aiohttp.request')
-    def test_skip_images(self, mock_get):
+    def test_skip_images(self):
         check = url.UrlValidator('html', skip_images=True)
-        self._check(mock_get, '<img alt="image" src="http://no-image" />', 200, check)
+        self._check('<img alt="image" src="http://no-image" />', 200, check)
 
-        self.assertFalse(mock_get.called)
+        self.assertFalse(self.request.called)
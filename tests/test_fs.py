@@ -65,3 +65,26 @@ class TestPaths(TestCase):
     def test_fail_on_missing_parameter(self):
         with self.assertRaises(ValueError):
             files('tests/fixtures/flat/test.{lang}.txt')
+
+    def test_stream_with_parameter(self):
+        expected = [[Path('tests/fixtures/lang/en/test1.md'),
+                     Path('tests/fixtures/lang/de/test1.md')]]
+
+        actual = list(files('tests/fixtures/lang/{lang}/test1.md', stream=True, lang='en'))
+
+        self.assertEqual(expected, actual)
+
+    def test_stream_same_groups(self):
+        pattern = 'tests/fixtures/lang/{lang}/*.md'
+
+        expected = list(files(pattern, lang='en'))
+        actual = list(files(pattern, stream=True, lang='en'))
+
+        self.assertEqual(expected, actual)
+
+    def test_stream_without_parameters(self):
+        expected = list(files('tests/fixtures/flat/*.txt'))
+
+        actual = list(files('tests/fixtures/flat/*.txt', stream=True))
+
+        self.assertEqual(expected, actual)
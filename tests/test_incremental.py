@@ -0,0 +1,94 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+from pathlib import Path
+import tempfile
+import shutil
+import os
+
+from validator import incremental, checks, parsers
+from validator.errors import UrlDiff
+
+
+class TestIncrementalCheck(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.directory, 'manifest')
+        self.contents = {'en1': '##aaa', 'de1': '#aaa', 'en2': 'aaa %1.2s', 'de2': 'aaa %1.2s'}
+        self.reader = MagicMock()
+        self.reader.read.side_effect = lambda path: self.contents[path]
+        self.parser = parsers.ChainParser([])
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _check(self, check):
+        incremental_check = incremental.IncrementalCheck(check, self.manifest_path)
+        return incremental_check.check([['en1', 'de1'], ['en2', 'de2']], self.parser, self.reader)
+
+    def test_replay_unchanged_rows(self):
+        first = self._check(checks.ChainCheck([checks.JavaComparator()]))
+
+        check = MagicMock()
+        check.__repr__ = lambda _: 'ChainCheck([JavaComparator()])'
+        second = self._check(check)
+
+        self.assertFalse(check.check.called)
+        self.assertEqual([(e.base.original, e.other.original) for e in first],
+                         [(e.base.original, e.other.original) for e in second])
+
+    def test_check_only_changed_rows(self):
+        self._check(checks.ChainCheck([checks.JavaComparator()]))
+        self.contents['de2'] = 'aaa'
+
+        check = MagicMock()
+        check.__repr__ = lambda _: 'ChainCheck([JavaComparator()])'
+        check.check.return_value = []
+        self._check(check)
+
+        self.assertEqual([['en2', 'de2']], check.check.call_args[0][0])
+
+    def test_keep_only_changed_contents(self):
+        self._check(checks.ChainCheck([checks.JavaComparator()]))
+        self.contents['de2'] = 'aaa'
+        self.reader.reset_mock()
+
+        incremental_check = incremental.IncrementalCheck(checks.ChainCheck([checks.JavaComparator()]),
+                                                         self.manifest_path)
+        _, _, _, store = incremental_check._prepare([['en1', 'de1'], ['en2', 'de2']], self.parser, self.reader)
+        store.read('en2')
+        store.read('de2')
+        store.read('en1')
+
+        self.assertEqual(['en1', 'de1', 'en2', 'de2', 'en1'], [c[0][0] for c in self.reader.read.call_args_list])
+
+    def test_full_run_when_checks_change(self):
+        self._check(checks.ChainCheck([checks.JavaComparator()]))
+
+        check = MagicMock()
+        check.__repr__ = lambda _: 'ChainCheck([MarkdownComparator()])'
+        check.check.return_value = []
+        self._check(check)
+
+        self.assertEqual(2, len(check.check.call_args[0][0]))
+
+    def test_merge_url_errors_from_rows(self):
+        errors = [UrlDiff('http://a.com', [Path('en')], 404), UrlDiff('http://a.com', [Path('de')], 404)]
+
+        actual = incremental._merge_errors(errors)
+
+        self.assertEqual(1, len(actual))
+        self.assertEqual([Path('en'), Path('de')], actual[0].files)
+
+    def test_recheck_rows_with_unchecked_urls(self):
+        check = MagicMock()
+        check.__repr__ = lambda _: 'ChainCheck([UrlValidator()])'
+        check.check.return_value = [UrlDiff('http://a.com', ['en1', 'en2'], None, reason='unchecked'),
+                                    UrlDiff('http://b.com', ['en2'], 404)]
+
+        first = self._check(check)
+        check.check.return_value = []
+        self._check(check)
+
+        self.assertEqual(['unchecked'], [e.reason for e in first if e.reason])
+        self.assertFalse(first[0].is_valid())
+        self.assertEqual([['en1', 'de1'], ['en2', 'de2']], check.check.call_args[0][0])
@@ -0,0 +1,137 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+import markdown
+
+from validator import parsers
+
+
+class TestContentStore(TestCase):
+    def setUp(self):
+        self.parser = MagicMock()
+        self.parser.parse.side_effect = lambda content: content.upper()
+        self.reader = MagicMock()
+        self.reader.read.side_effect = lambda path: 'content of %s' % path
+        self.store = parsers.ContentStore(self.parser, self.reader)
+
+    def test_read_once_per_path(self):
+        self.store.read('path1')
+        self.store.read('path1')
+        self.store.read('path2')
+
+        self.assertEqual(2, self.reader.read.call_count)
+
+    def test_parse_once_per_content(self):
+        actual = self.store.parse(self.store.read('path1'))
+        self.store.parse(self.store.read('path1'))
+
+        self.assertEqual('CONTENT OF PATH1', actual)
+        self.assertEqual(1, self.parser.parse.call_count)
+
+    def test_drop(self):
+        self.store.parse(self.store.read('path1'))
+        self.store.drop(['path1'])
+        self.store.parse(self.store.read('path1'))
+
+        self.assertEqual(2, self.reader.read.call_count)
+        self.assertEqual(2, self.parser.parse.call_count)
+
+
+class TestPrefetchReader(TestCase):
+    def setUp(self):
+        self.reader = MagicMock()
+        self.reader.read.side_effect = lambda path: 'content of %s' % path
+        self.prefetch_reader = parsers.PrefetchReader(self.reader, workers=2, window=2)
+
+    def test_read_prefetched(self):
+        rows = [['path1', 'path2'], ['path3', 'path4']]
+
+        actual = [[self.prefetch_reader.read(path) for path in row] for row in self.prefetch_reader.prefetch(rows)]
+
+        self.assertEqual([['content of path1', 'content of path2'], ['content of path3', 'content of path4']],
+                         actual)
+        self.assertEqual(4, self.reader.read.call_count)
+
+    def test_bounded_window(self):
+        rows = iter([['path%s' % i] for i in range(10)])
+
+        next(self.prefetch_reader.prefetch(rows))
+
+        self.assertEqual(7, len(list(rows)))
+
+    def test_read_not_prefetched(self):
+        self.assertEqual('content of path1', self.prefetch_reader.read('path1'))
+
+
+class TestXmlParser(TestCase):
+    content = '<resources><string name="a">aaa</string><string name="b"> bbb </string></resources>'
+
+    def test_joined(self):
+        self.assertEqual('aaa\n\nbbb', parsers.XmlParser('string').parse(self.content))
+
+    def test_keyed(self):
+        actual = parsers.XmlParser('string', keyed=True).parse(self.content)
+
+        self.assertEqual([('a', 'aaa'), ('b', 'bbb')], list(actual.items()))
+
+    def test_keyed_chain(self):
+        parser = parsers.ChainParser([parsers.XmlParser('string', keyed=True), parsers.CsvParser()])
+
+        actual = parser.parse('<resources><string name="a">a,b</string></resources>')
+
+        self.assertEqual({'a': 'a\nb'}, dict(actual))
+
+    def test_align_keyed(self):
+        actual = list(parsers.align({'a': '1', 'b': '2'}, {'b': '3', 'c': '4'}))
+
+        self.assertEqual([('b', '2', '3')], actual)
+
+
+class TestLxmlParser(TestCase):
+    content = '<?xml version="1.0" encoding="utf-8"?>' \
+        '<resources><string name="a">aaa</string><plurals name="p"><item>ppp</item></plurals>' \
+        '<string name="b"> bbb </string></resources>'
+
+    def test_xpath(self):
+        actual = parsers.LxmlParser('//string[@name="b"]').parse(self.content)
+
+        self.assertEqual('bbb', actual)
+
+    def test_same_as_etree(self):
+        expected = parsers.XmlParser('string', keyed=True).parse(self.content)
+        actual = parsers.LxmlParser('string', keyed=True).parse(self.content)
+
+        self.assertEqual(expected, actual)
+
+    def test_iterparse(self):
+        actual = parsers.LxmlParser('string', keyed=True, iterparse=True).parse(self.content)
+
+        self.assertEqual([('a', 'aaa'), ('b', 'bbb')], list(actual.items()))
+
+    def test_iterparse_default_query(self):
+        keyed = parsers.LxmlParser(keyed=True, iterparse=True).parse(self.content)
+        text = parsers.LxmlParser(iterparse=True).parse(self.content)
+
+        self.assertEqual(parsers.XmlParser(keyed=True).parse(self.content), keyed)
+        self.assertEqual(parsers.XmlParser().parse(self.content), text)
+
+
+class TestCsvParser(TestCase):
+    def test_value_per_line(self):
+        self.assertEqual('a\nb\nc\nd', parsers.CsvParser().parse('a,b\nc,d'))
+
+    def test_quoted_values(self):
+        self.assertEqual('a, b\nc\nd', parsers.CsvParser().parse('"a, b",c\nd'))
+
+    def test_columns_by_index(self):
+        self.assertEqual('b\nd', parsers.CsvParser([1]).parse('a,b\nc,d\n'))
+
+    def test_columns_by_name(self):
+        content = 'key,en,de\nhello,Hello,"Hallo, Welt"\n'
+
+        self.assertEqual('Hallo, Welt', parsers.CsvParser(['de']).parse(content))
+
+
+class TestRenderMarkdown(TestCase):
+    def test_same_as_markdown(self):
+        for content in ['# aaa\n\n* a\n* b', '[link](http://a.com)', '# aaa\n\n* a\n* b']:
+            self.assertEqual(markdown.markdown(content), parsers.render_markdown(content))
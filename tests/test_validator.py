@@ -1,5 +1,5 @@
 from unittest import TestCase
-from unittest.mock import patch, MagicMock
+from unittest.mock import MagicMock
 from pathlib import Path
 import tempfile
 import os
@@ -7,32 +7,34 @@ import shutil
 from . import AsyncTestCase
 
 import validator
+from validator.errors import UrlDiff, MdDiff, ContentData
 
 
 class TestUrls(AsyncTestCase):
+    def setUp(self):
+        super().setUp()
+        self.request = self.patch_session().request
+
     def _test_plain_text(self):
         return validator.parse().files('tests/fixtures/flat/test.en.txt').check().url().validate()
 
-    @patch('aiohttp.request')
-    def test_plain_text_success(self, mock_get):
+    def test_plain_text_success(self):
         res = MagicMock()
         res.status = 200
-        mock_get.return_value = self.make_fut(res)
+        self.request.return_value = self.make_fut(res)
         errors = self._test_plain_text()
         self.assertEqual([], errors)
 
-    @patch('aiohttp.request')
-    def test_plain_text_failure(self, mock_get):
+    def test_plain_text_failure(self):
         res = MagicMock()
         res.status = 404
-        mock_get.return_value = self.make_fut(res)
+        self.request.return_value = self.make_fut(res)
         errors = self._test_plain_text()
         self.assertTrue(Path('tests/fixtures/flat/test.en.txt') in errors[0].files)
 
-    @patch('aiohttp.request')
-    def test_md_with_params(self, mock_get):
+    def test_md_with_params(self):
         validator.parse().files('tests/fixtures/flat/url_with_params.md').md().check().url().validate()
-        self.assertFalse(mock_get.called)
+        self.assertFalse(self.request.called)
 
 
 class TestMarkdown(TestCase):
@@ -69,6 +71,49 @@ class TestReporter(TestCase):
 
         self.assertNotEqual([], os.listdir(self.output_dir))
 
+    def test_report_url_errors(self):
+        errors = [UrlDiff('http://a.com/<b>', [Path('en/test.md'), Path('de/test.md')], 404)]
+
+        validator.reports.HtmlReporter(self.output_dir).report(errors)
+
+        with open(os.path.join(self.output_dir, 'de', 'test.html')) as fp:
+            self.assertIn('<span>http://a.com/&lt;b&gt; returned with code 404</span>', fp.read())
+
+    def test_report_keyed_errors(self):
+        def error(key):
+            base = ContentData(Path('en/strings.xml'), 'a', 'a')
+            other = ContentData(Path('de/strings.xml'), 'b', 'b')
+            return MdDiff(base, other, ['error'], key)
+
+        validator.reports.HtmlReporter(self.output_dir).report([error('action.settings'), error('action.share')])
+
+        self.assertEqual(['action_settings.html', 'action_share.html'],
+                         sorted(os.listdir(os.path.join(self.output_dir, 'de', 'strings.xml'))))
+
+    def test_report_stable(self):
+        def report():
+            validator.parse().files('tests/fixtures/lang/{lang}/test2.md', lang='en').check().md().report() \
+                .html(self.output_dir).validate()
+            with open(os.path.join(self.output_dir, 'tests/fixtures/lang/de/test2.html'), 'rb') as fp:
+                return fp.read()
+
+        self.assertEqual(report(), report())
+
+    def test_consolidated_report(self):
+        def errors(*urls):
+            return [UrlDiff(url, [Path('en/test.md'), Path('de/%s.md' % index)], 404) for index, url in enumerate(urls)]
+
+        reporter = validator.reports.ConsolidatedHtmlReporter(self.output_dir, page_size=1)
+        reporter.report(errors('http://a.com', 'http://b.com'))
+        self.assertEqual(['de-1.html', 'de-2.html', 'en-1.html', 'index.html', 'style.css'],
+                         sorted(os.listdir(self.output_dir)))
+
+        page_path = os.path.join(self.output_dir, 'de-1.html')
+        os.utime(page_path, (0, 0))
+        reporter.report(errors('http://a.com'))
+        self.assertEqual(['de-1.html', 'en-1.html', 'index.html', 'style.css'], sorted(os.listdir(self.output_dir)))
+        self.assertEqual(0, os.path.getmtime(page_path))
+
 
 class TestBugs(TestCase):
     def _run_and_assert(self, query, **kwargs):
@@ -137,3 +182,48 @@ class TestJava(TestCase):
         java_comparator_inst = validator.checks.JavaComparator()
         errors = java_comparator_inst.check(None, validator.parsers.ChainParser([]), validator.parsers.TxtReader())
         self.assertEqual([], errors)
+
+
+class TestChainCheck(TestCase):
+    def test_read_and_parse_once(self):
+        reader = MagicMock()
+        reader.read.side_effect = lambda path: 'aaa %1.2s aaa'
+        parser = MagicMock()
+        parser.parse.side_effect = lambda content: content
+        contents = iter([['path1', 'path2']])
+        check = validator.checks.ChainCheck([validator.checks.JavaComparator(), validator.checks.JavaComparator()])
+
+        errors = check.check(contents, parser, reader)
+
+        self.assertEqual([], errors)
+        self.assertEqual(2, reader.read.call_count)
+        self.assertEqual(1, parser.parse.call_count)
+
+    def test_release_contents_in_last_check(self):
+        reader = MagicMock()
+        reader.read.side_effect = lambda path: 'aaa %1.2s ' + path
+        store = validator.parsers.ContentStore(validator.parsers.ChainParser([]), reader)
+        contents = iter([['path1', 'path2'], ['path3', 'path4']])
+        check = validator.checks.ChainCheck([validator.checks.JavaComparator(), validator.checks.JavaComparator()])
+
+        check.check(contents, store, store)
+
+        self.assertEqual(4, reader.read.call_count)
+        self.assertEqual(({}, {}), (store._raw, store._parsed))
+        self.assertFalse(store.releasing)
+
+
+class TestKeyedXml(TestCase):
+    def test_error_per_string(self):
+        t1 = '<resources><string name="a">aaa %1s</string><string name="b">bbb %1s</string></resources>'
+        t2 = '<resources><string name="a">aaa %1s</string><string name="b">bbb</string></resources>'
+        errors = validator.parse().text(t1, t2).xml('string', keyed=True).check().java().validate()
+        self.assertEqual(['b'], [error.key for error in errors])
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            validator.parse().text('<a/>', '<a/>').xml(engine='lxlm')
+
+    def test_lxml_options_with_etree(self):
+        with self.assertRaises(TypeError):
+            validator.parse().text('<a/>', '<a/>').xml(iterparse=True)
@@ -1,4 +1,4 @@
-from . import parsers, checks, reports, fs
+from . import parsers, checks, reports, fs, cache, incremental
 
 
 class Validator(object):
@@ -30,8 +30,11 @@ class ReportBuilder(object):
         self.check = check
         self.reporters = []
 
-    def html(self, output_directory='errors'):
-        self.reporters.append(reports.HtmlReporter(output_directory))
+    def html(self, output_directory='errors', consolidated=False, **kwargs):
+        if consolidated:
+            self.reporters.append(reports.ConsolidatedHtmlReporter(output_directory, **kwargs))
+        else:
+            self.reporters.append(reports.HtmlReporter(output_directory, **kwargs))
         return self
 
     def console(self):
@@ -48,15 +51,16 @@ class ReportBuilder(object):
 
 
 class CheckBuilder(object):
-    def __init__(self, contents, content_type, parser, reader):
+    def __init__(self, contents, content_type, parser, reader, manifest_path=None):
         self.contents = contents
         self.content_type = content_type
         self.parser = parser
         self.reader = reader
+        self.manifest_path = manifest_path
         self.checks = []
 
-    def md(self):
-        self.checks.append(checks.markdown(self.content_type))
+    def md(self, jobs=1):
+        self.checks.append(checks.markdown(self.content_type, jobs=jobs))
         return self
 
     def url(self, **kwargs):
@@ -67,16 +71,22 @@ class CheckBuilder(object):
         self.checks.append(checks.java_args(self.content_type))
         return self
 
-    def report(self):
+    def _check(self):
         check = checks.ChainCheck(self.checks)
+        if self.manifest_path is not None:
+            check = incremental.IncrementalCheck(check, self.manifest_path)
+        return check
+
+    def report(self):
+        check = self._check()
         return ReportBuilder(self.contents, self.parser, self.reader, check)
 
     def validate(self):
-        check = checks.ChainCheck(self.checks)
+        check = self._check()
         return Validator(self.contents, self.parser, self.reader, check).validate()
 
     def async_validate(self):
-        check = checks.ChainCheck(self.checks)
+        check = self._check()
         res = yield from Validator(self.contents, self.parser, self.reader, check).async_validate()
         return res
 
@@ -88,6 +98,8 @@ class ParserBuilder(object):
         self.content_type = 'txt'
         self.reader = reader or parsers.TxtReader()
         self.parsers = []
+        self.parse_cache = None
+        self.manifest_path = None
 
     def html(self):
         self.content_type = 'html'
@@ -98,19 +110,41 @@ class ParserBuilder(object):
         self.parsers.append(parsers.MarkdownParser())
         return self
 
-    def xml(self, query='*'):
+    def xml(self, query='*', keyed=False, engine='etree', **kwargs):
         self.content_type = 'txt'
-        self.parsers.append(parsers.XmlParser(query))
+        if engine == 'lxml':
+            self.parsers.append(parsers.LxmlParser(query, keyed, **kwargs))
+        elif engine != 'etree':
+            raise ValueError('xml engine must be one of %s' % (('etree', 'lxml'), ))
+        elif kwargs:
+            raise TypeError('options %s need the lxml engine' % sorted(kwargs))
+        else:
+            self.parsers.append(parsers.XmlParser(query, keyed))
         return self
 
-    def csv(self):
+    def csv(self, columns=None, delimiter=','):
         self.content_type = 'txt'
-        self.parsers.append(parsers.CsvParser())
+        self.parsers.append(parsers.CsvParser(columns, delimiter))
+        return self
+
+    def cache(self, directory='.validator_cache', max_size=cache.DEFAULT_MAX_SIZE):
+        self.parse_cache = cache.ParseCache(directory, max_size)
+        return self
+
+    def prefetch(self, workers=8, window=64):
+        self.reader = parsers.PrefetchReader(self.reader, workers, window)
+        self.contents = self.reader.prefetch(self.contents)
+        return self
+
+    def incremental(self, manifest_path='.validator_manifest'):
+        self.manifest_path = manifest_path
         return self
 
     def check(self):
         parser = parsers.ChainParser(self.parsers)
-        return CheckBuilder(self.contents, self.content_type, parser, self.reader)
+        if self.parse_cache is not None:
+            parser = cache.CachedParser(parser, self.parse_cache)
+        return CheckBuilder(self.contents, self.content_type, parser, self.reader, self.manifest_path)
 
 
 class ContentBuilder(object):
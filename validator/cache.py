@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import pickle
+import sqlite3
+import hashlib
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# bump when the format of the parsed content changes so old entries are ignored
+CACHE_VERSION = 1
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+class ParseCache(object):
+    """
+    On disk cache of parsed content keyed by the hash of the content and the parser configuration.
+
+    Entries are pickled to separate files, reads touch the file so the least recently used entries are evicted
+    first once the cache grows over ``max_size`` bytes. Writes go through a temporary file and a rename so
+    multiple processes can share the directory.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def key(self, parser, content):
+        data = '%s\0%r\0%s' % (CACHE_VERSION, parser, content)
+        return hashlib.sha1(data.encode('utf-8', 'surrogatepass')).hexdigest()
+
+    def get(self, key):
+        """
+        Returns a tuple of a flag saying if the key was found and the cached value.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as fp:
+                value = pickle.load(fp)
+            os.utime(path)
+            return True, value
+        except FileNotFoundError:
+            return False, None
+        except Exception:
+            logger.warning('invalid cache entry %s', path)
+            return False, None
+
+    def set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            pickle.dump(value, fp, pickle.HIGHEST_PROTOCOL)
+        self._size = self._size + os.path.getsize(tmp_path)
+        os.replace(tmp_path, path)
+        if self._size > self.max_size:
+            self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache fits in half of ``max_size``.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        self._size = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if self._size <= self.max_size // 2:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size = self._size - size
+
+
+class CachedParser(object):
+    """
+    Wraps a parser and stores its results in a ``ParseCache``.
+    """
+
+    def __init__(self, parser, cache):
+        self.parser = parser
+        self.cache = cache
+
+    def __repr__(self):
+        return repr(self.parser)
+
+    def parse(self, content):
+        if not isinstance(content, str):
+            return self.parser.parse(content)
+        key = self.cache.key(self.parser, content)
+        found, parsed = self.cache.get(key)
+        if not found:
+            parsed = self.parser.parse(content)
+            self.cache.set(key, parsed)
+        return parsed
+
+
+# seconds urls are cached for by status code range, successful checks are trusted longer than failures
+DEFAULT_URL_TTLS = ((200, 300, 7 * 24 * 3600), (300, 400, 24 * 3600), (400, 500, 3600), (500, 600, 600))
+
+
+class UrlCache(object):
+    """
+    Sqlite cache of url status codes, every status range has its own time to live in ``ttls``. The database runs
+    in WAL mode with a busy timeout so multiple jobs can share the file.
+    """
+
+    def __init__(self, path, ttls=DEFAULT_URL_TTLS):
+        self.path = path
+        self.ttls = ttls
+        self._db = sqlite3.connect(path, timeout=30)
+        try:
+            self._db.execute('PRAGMA journal_mode=WAL')
+        except sqlite3.DatabaseError:
+            logger.warning('cannot use WAL mode for %s', path)
+        with self._db:
+            self._db.execute('CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, status INTEGER, expires REAL)')
+
+    def _ttl(self, status):
+        for start, end, ttl in self.ttls:
+            if start <= status < end:
+                return ttl
+        return 0
+
+    def get_many(self, urls):
+        """
+        Returns a dict of urls to status codes for urls with a valid cache entry.
+        """
+        urls = list(urls)
+        result = {}
+        now = time.time()
+        for start in range(0, len(urls), 500):
+            chunk = urls[start:start + 500]
+            query = 'SELECT url, status FROM urls WHERE expires > ? AND url IN (%s)' % ','.join('?' * len(chunk))
+            result.update(self._db.execute(query, [now] + chunk))
+        return result
+
+    def set_many(self, statuses):
+        now = time.time()
+        rows = [(url, status, now + self._ttl(status)) for url, status in statuses.items() if self._ttl(status)]
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO urls (url, status, expires) VALUES (?, ?, ?)', rows)
+
+    def close(self):
+        self._db.close()
+
+
+class UrlCassette(object):
+    """
+    Url statuses recorded to a json file so checks can be replayed without network. Recording merges new
+    statuses into the existing ones, the file is sorted by url to keep diffs of the recordings readable.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as fp:
+                self._statuses = json.load(fp)
+        except FileNotFoundError:
+            self._statuses = {}
+
+    def get_many(self, urls):
+        return {url: self._statuses[url] for url in urls if url in self._statuses}
+
+    def set_many(self, statuses):
+        self._statuses.update(statuses)
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as fp:
+            json.dump(self._statuses, fp, indent=2, sort_keys=True)
+            fp.write('\n')
+        os.replace(tmp_path, self.path)
@@ -1,6 +1,7 @@
 from .md import MarkdownComparator
 from .url import UrlValidator
 from .java import JavaComparator
+from ..parsers import ContentStore
 
 
 class UndefinedCheckTypeError(Exception):
@@ -11,10 +12,10 @@ def urls(filetype, **kwargs):
     return UrlValidator(filetype, **kwargs)
 
 
-def markdown(filetype):
+def markdown(filetype, **kwargs):
     if filetype not in ['txt', 'html']:
         raise UndefinedCheckTypeError('got filetype %s' % filetype)
-    return MarkdownComparator()
+    return MarkdownComparator(**kwargs)
 
 
 def java_args(filetype):
@@ -23,20 +24,79 @@ def java_args(filetype):
     return JavaComparator()
 
 
+class _Rows(object):
+    """
+    Iterates the contents once and replays the recorded rows to every following iteration, ``drain`` replays
+    them for the last time without keeping them.
+    """
+
+    def __init__(self, contents):
+        self._contents = iter(contents)
+        self._rows = []
+
+    def _next(self):
+        row = next(self._contents, None)
+        if row is None:
+            return False
+        self._rows.append(list(row))
+        return True
+
+    def __iter__(self):
+        index = 0
+        while index < len(self._rows) or self._next():
+            yield self._rows[index]
+            index = index + 1
+
+    def drain(self):
+        rows, self._rows = self._rows, []
+        rows.reverse()
+        while rows:
+            yield rows.pop()
+        for row in self._contents:
+            yield list(row)
+
+
 class ChainCheck(object):
+    """
+    Runs all checks over the same contents. Every row is taken from the contents once and every path is read
+    and parsed once, the result is shared by all the checks.
+
+    The rows and contents are kept in memory until the last check, which releases them as it goes, so a single
+    check runs in flat memory while a chain of checks holds all contents at its peak.
+    """
+
     def __init__(self, checks):
         self.checks = checks
 
+    def __repr__(self):
+        return 'ChainCheck(%r)' % self.checks
+
+    def _runs(self, contents, parser, reader):
+        """
+        Yields the checks with the rows and the store to run them with.
+        """
+        rows = _Rows(contents)
+        store = ContentStore.of(parser, reader)
+        releasing = store.releasing
+        try:
+            for index, check in enumerate(self.checks):
+                if index == len(self.checks) - 1:
+                    store.releasing = True
+                    yield check, rows.drain(), store
+                else:
+                    yield check, rows, store
+        finally:
+            store.releasing = releasing
+
     def check(self, contents, parser, reader):
         errors = []
-        for check in self.checks:
-            check_errors = check.check(contents, parser, reader)
-            errors.extend(check_errors)
+        for check, rows, store in self._runs(contents, parser, reader):
+            errors.extend(check.check(rows, store, store))
         return errors
 
     def async_check(self, contents, parser, reader):
         errors = []
-        for check in self.checks:
-            check_errors = yield from check.async_check(contents, parser, reader)
+        for check, rows, store in self._runs(contents, parser, reader):
+            check_errors = yield from check.async_check(rows, store, store)
             errors.extend(check_errors)
         return errors
@@ -1,39 +1,31 @@
 import re
 
 from ..errors import MdDiff, ContentData
+from ..parsers import align
 
 ARG_PATTERN = r'%(?:\d+\$)?(?:[a-zA-Z]+)?(?:\d+)?(?:.\d+)?[a-zA-Z]+'
 REF_PATTERN = r'@string/\w+'
 
 
 class JavaComparator(object):
+    def __repr__(self):
+        return 'JavaComparator()'
+
     def _get_args(self, content):
         return re.findall(ARG_PATTERN, content)
 
-    def _args_check(self, base, other):
-        base_args = self._get_args(base)
-        other_args = self._get_args(other)
-        if len(base_args) != len(other_args):
-            base_data = ContentData(base, base, '')
-            other_data = ContentData(other, other, '')
-            return MdDiff(base_data, other_data, 'java args do not match')
-        return None
+    def _args_match(self, base, other):
+        return len(self._get_args(base)) == len(self._get_args(other))
 
-    def _ref_check(self, base, other):
+    def _refs_match(self, base, other):
         if self._has_ref(base):
-            if not self._only_ref(base):
-                base_data = ContentData(base, base, '')
-                other_data = ContentData(other, other, '')
-                return MdDiff(base_data, other_data, 'java args do not match')
-            if not self._only_ref(other):
-                base_data = ContentData(base, base, '')
-                other_data = ContentData(other, other, '')
-                return MdDiff(base_data, other_data, 'java args do not match')
-        elif self._has_ref(other):
-            base_data = ContentData(base, base, '')
-            other_data = ContentData(other, other, '')
-            return MdDiff(base_data, other_data, 'java args do not match')
-        return None
+            return self._only_ref(base) and self._only_ref(other)
+        return not self._has_ref(other)
+
+    def _error(self, base, base_content, other, other_content, key):
+        base_data = ContentData(base, base_content, '')
+        other_data = ContentData(other, other_content, '')
+        return MdDiff(base_data, other_data, 'java args do not match', key)
 
     def _only_ref(self, content):
         return re.fullmatch(REF_PATTERN, content) is not None
@@ -45,15 +37,14 @@ class JavaComparator(object):
         data = data or []
         errors = []
         for row in data:
-            row_items = list(map(str, row))
-            base = row_items.pop(0)
-            base_content = parser.parse(reader.read(base))
-            for other in row_items:
-                other_content = parser.parse(reader.read(other))
-                ref_error = self._ref_check(base_content, other_content)
-                if ref_error:
-                    errors.append(ref_error)
-                arg_error = self._args_check(base_content, other_content)
-                if arg_error:
-                    errors.append(arg_error)
+            base = row[0]
+            base_parsed = parser.parse(reader.read(base))
+            for other in row[1:]:
+                other_parsed = parser.parse(reader.read(other))
+                for key, base_content, other_content in align(base_parsed, other_parsed):
+                    base_content, other_content = str(base_content), str(other_content)
+                    if not self._refs_match(base_content, other_content):
+                        errors.append(self._error(base, base_content, other, other_content, key))
+                    if not self._args_match(base_content, other_content):
+                        errors.append(self._error(base, base_content, other, other_content, key))
         return errors
@@ -1,8 +1,11 @@
 import re
+from collections import OrderedDict
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from sdiff import diff, renderer
-from markdown import markdown
 
 from ..errors import MdDiff, ContentData
+from ..parsers import align, render_markdown
 
 LINK_RE = r'\]\(([^\)]+)\)'
 
@@ -12,28 +15,74 @@ def save_file(content, filename):
         fp.write(content)
 
 
+def _diff(contents):
+    base_parsed, other_parsed = contents
+    other_diff, base_diff, error = diff(other_parsed, base_parsed, renderer=renderer.HtmlRenderer())
+    return other_diff, base_diff, [e.message for e in error or []]
+
+
 class MarkdownComparator(object):
+    """
+    Compares markdown structure of every file in a row with the first one, rows are diffed as they are read. With
+    ``jobs`` greater than 1 all rows are read first and the diffs run in a pool of processes, errors are returned
+    in the same order as in the serial mode.
+
+    Keyed contents are compared string by string, texts equal to the base are skipped and every distinct pair
+    of texts is diffed only once.
+    """
+
+    def __init__(self, jobs=1):
+        self.jobs = jobs
+
+    def __repr__(self):
+        return 'MarkdownComparator()'
+
+    def _pairs(self, data, parser, reader):
+        for row in data:
+            base = row[0]
+            base_parsed = parser.parse(reader.read(base))
+            for other in row[1:]:
+                other_parsed = parser.parse(reader.read(other))
+                for key, base_text, other_text in align(base_parsed, other_parsed):
+                    if base_text != other_text:
+                        yield base, base_text, other, other_text, key
+
+    def _serial_diffs(self, pairs):
+        cached_diff = lru_cache(maxsize=1024)(_diff)
+        for pair in pairs:
+            _, base_text, _, other_text, _ = pair
+            yield pair, cached_diff((base_text, other_text))
+
+    def _pool_diffs(self, pairs):
+        pairs = list(pairs)
+        contents = list(OrderedDict.fromkeys((base_text, other_text) for _, base_text, _, other_text, _ in pairs))
+        chunksize = max(1, len(contents) // (self.jobs * 4))
+        with ProcessPoolExecutor(self.jobs) as executor:
+            results = dict(zip(contents, executor.map(_diff, contents, chunksize=chunksize)))
+        for pair in pairs:
+            _, base_text, _, other_text, _ = pair
+            yield pair, results[(base_text, other_text)]
+
+    def _diffs(self, pairs):
+        """
+        Yields pairs with their diffs. The serial mode diffs every pair as it's read, the pool needs all of them.
+        """
+        if self.jobs > 1:
+            return self._pool_diffs(pairs)
+        return self._serial_diffs(pairs)
+
     def check(self, data, parser, reader):
         if not data:
             return []
 
-        # TODO use yield instead of array
         errors = []
-        for row in data:
-            base = row.pop(0)
-            base_parsed = parser.parse(reader.read(base))
-            base_html = markdown(base_parsed)
-            for other in row:
-                other_parsed = parser.parse(reader.read(other))
-                other_html = markdown(other_parsed)
-                other_diff, base_diff, error = diff(other_parsed, base_parsed, renderer=renderer.HtmlRenderer())
-                if error:
-                    error_msgs = []
-                    if error:
-                        error_msgs = map(lambda e: e.message, error)
-                    base_data = ContentData(base, base_parsed, base_diff, base_html)
-                    other_data = ContentData(other, other_parsed, other_diff, other_html)
-                    errors.append(MdDiff(base_data, other_data, error_msgs))
+        for pair, result in self._diffs(self._pairs(data, parser, reader)):
+            base, base_parsed, other, other_parsed, key = pair
+            other_diff, base_diff, error_msgs = result
+            if error_msgs:
+                base_data = ContentData(base, base_parsed, base_diff, render_markdown(base_parsed))
+                other_data = ContentData(other, other_parsed, other_diff, render_markdown(other_parsed))
+                errors.append(MdDiff(base_data, other_data, error_msgs, key))
         return errors
 
     def get_broken_links(self, base, other):
@@ -3,10 +3,17 @@ import logging
 import asyncio
 import aiohttp
 import string
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse, urljoin
+import random
+from itertools import zip_longest
+from collections import deque, defaultdict, OrderedDict
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from html.parser import HTMLParser
+from urllib.parse import urlparse, urljoin, urlsplit, urlunsplit
 
 from ..errors import UrlDiff
+from ..cache import UrlCache, UrlCassette, DEFAULT_URL_TTLS
+from ..parsers import flatten
 
 logging.getLogger('aiohttp').setLevel(logging.ERROR)
 logging.getLogger('asyncio').setLevel(logging.ERROR)
@@ -19,13 +26,71 @@ class MissingUrlExtractorError(Exception):
     pass
 
 
-class TextUrlExtractor(object):
-    def __init__(self, **kwargs):
-        pass
+# urls start at a scheme or at www, the body is scanned by _url_end without backtracking over the whole text
+_URL_START = re.compile(r'(?i)\b(?:https?://|www\d{0,3}[.]|!keepsafe://[a-z0-9.\-]+[.][a-z]{2,4}/)')
+# a run of plain url characters or parentheses nested at most two levels deep
+_URL_TOKEN = re.compile(r'[^\s()\[\]<>]+|\((?:[^\s()<>]|\([^\s()<>]+\))*\)')
+# characters a url can end with, punctuation after a url belongs to the text
+_URL_LAST_CHAR = re.compile('[^\\s`!()\\[\\];:\'".,<>?\xab\xbb\u201c\u201d\u2018\u2019]')
+
+
+def _url_end(text, start):
+    """
+    Returns the end of the url body starting at ``start`` or None when there is none. The body is the longest run
+    of tokens ending with a parenthesized token or a character allowed at the end, with something before it.
+    Every character is scanned by the token pattern once and at most once more looking for the end.
+    """
+    tokens = []
+    pos = start
+    while True:
+        match = _URL_TOKEN.match(text, pos)
+        if match is None:
+            break
+        tokens.append(match.span())
+        pos = match.end()
+    for token_start, token_end in reversed(tokens):
+        if text[token_start] == '(':
+            if token_start > start:
+                return token_end
+            continue
+        for end in range(token_end, max(token_start, start + 1), -1):
+            if _URL_LAST_CHAR.match(text, end - 1):
+                return end
+    return None
+
+
+def _match_url(text, pos=0):
+    """
+    Returns the url starting at ``pos`` or None.
+    """
+    match = _URL_START.match(text, pos)
+    if match is None:
+        return None
+    end = _url_end(text, match.end())
+    if end is None:
+        return None
+    return text[pos:end]
+
+
+def _find_urls(text):
+    """
+    Yields urls in the text in linear time.
+    """
+    pos = 0
+    while True:
+        match = _URL_START.search(text, pos)
+        if match is None:
+            return
+        end = _url_end(text, match.end())
+        if end is None:
+            pos = match.start() + 1
+        else:
+            yield text[match.start():end]
+            pos = end
 
-    url_pattern = r'(?i)\b((?:https?://|www\d{0,3}[.]|(!keepsafe://)[a-z0-9.\-]+[.][a-z]{2,4}/)(?:[^\s()\[\]<>]' \
-        '+|\(([^\s()<>]+|(\([^\s()<>]+\)))*\))+(?:\(([^\s()<>]+|(\([^\s()<>]+\)))*\)|[^\s`!()\[' \
-        '\];:\'".,<>?\xab\xbb\u201c\u201d\u2018\u2019]))'
+
+class TextUrlExtractor(object):
+    options = ()
 
     def _without_params(self, url):
         return not bool(re.search(r'\{\{[a-zA-Z0-9_.]+\}\}', url))
@@ -34,12 +99,66 @@ class TextUrlExtractor(object):
         return ''.join(filter(lambda c: c in string.printable, url))
 
     def extract_urls(self, content):
-        result = set(match.group().strip(').') for match in re.finditer(self.url_pattern, content))
+        result = set(url.strip(').') for url in _find_urls(content))
         return filter(self._without_params, map(self._strip_non_ascii_chars, result))
 
 
+def _attr(attrs, name):
+    return next((value for key, value in attrs if key == name), None)
+
+
+class _LinkParser(HTMLParser):
+    """
+    Collects hrefs of anchors, or their text when they have none, and image sources while the html is being
+    parsed, without building a tree.
+    """
+
+    def __init__(self, skip_images=False):
+        super().__init__(convert_charrefs=True)
+        self.skip_images = skip_images
+        self.urls = set()
+        self._text = None
+
+    def _end_anchor(self):
+        if self._text is not None:
+            self.urls.add(''.join(self._text))
+            self._text = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self._end_anchor()
+            href = _attr(attrs, 'href')
+            if href:
+                self.urls.add(href)
+            else:
+                self._text = []
+        elif tag == 'img' and not self.skip_images:
+            src = _attr(attrs, 'src')
+            if src is not None:
+                self.urls.add(src)
+
+    def handle_endtag(self, tag):
+        if tag == 'a':
+            self._end_anchor()
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._end_anchor()
+
+
 class HtmlUrlExtractor(TextUrlExtractor):
-    def __init__(self, root_url='', skip_images=False, **kwargs):
+    """
+    Extracts urls from links and images in html, e.g. the html rendered by the markdown parser. The html is read
+    in a single pass by ``_LinkParser``.
+    """
+
+    options = ('root_url', 'skip_images')
+
+    def __init__(self, root_url='', skip_images=False):
         self.root_url = root_url
         self.skip_images = skip_images
 
@@ -49,14 +168,6 @@ class HtmlUrlExtractor(TextUrlExtractor):
                 return True
         return False
 
-    def _extract_from_anchors(self, soup):
-        return set([a.get('href') or a.text for a in soup.find_all('a')])
-
-    def _extract_from_img(self, soup):
-        if self.skip_images:
-            return set()
-        return set([img.get('src') for img in soup.find_all('img')])
-
     def _fix_url(self, url):
         result = ''
         url_parsed = urlparse(url)
@@ -64,12 +175,12 @@ class HtmlUrlExtractor(TextUrlExtractor):
             if self.root_url:
                 result = urljoin(self.root_url, url_parsed.geturl())
         elif url_parsed.scheme in ['http', 'https']:
-            if re.match(self.url_pattern, url_parsed.geturl()):
+            if _match_url(url_parsed.geturl()):
                 result = url_parsed.geturl()
         elif not url_parsed.scheme:
             if not self._validate_email(url_parsed.geturl()):
                 full_url = 'http://' + url_parsed.geturl()
-                if re.match(self.url_pattern, full_url):
+                if _match_url(full_url):
                     result = full_url
         else:
             logging.error('{} not tested'.format(url_parsed.geturl()))
@@ -77,49 +188,353 @@ class HtmlUrlExtractor(TextUrlExtractor):
 
     def extract_urls(self, content):
         result = []
-        soup = BeautifulSoup(content)
-        urls = self._extract_from_anchors(soup) | self._extract_from_img(soup)
-        for url in urls:
+        parser = _LinkParser(self.skip_images)
+        parser.feed(content)
+        parser.close()
+        for url in parser.urls:
             fixed_url = self._fix_url(url)
             if fixed_url and self._without_params(fixed_url):
                 result.append(fixed_url)
         return result
 
 
+# reason of urls left when the time budget of the check ran out
+UNCHECKED = 'unchecked'
+# reason of urls skipped because their host kept failing
+HOST_UNAVAILABLE = 'skipped, host unavailable'
+# reason of urls missing in a replayed cassette
+NOT_RECORDED = 'not recorded'
+
+CASSETTE_MODES = ('record', 'replay')
+
+CANONICAL_RULES = ('fragment', 'trailing_slash', 'host_case', 'default_port', 'tracking_params')
+
+# servers may answer /docs/ and /docs differently, so trailing slashes are kept unless asked for
+DEFAULT_CANONICAL_RULES = ('fragment', 'host_case', 'default_port', 'tracking_params')
+
+DEFAULT_TRACKING_PARAMS = ('utm_*', 'fbclid', 'gclid', 'mc_cid', 'mc_eid')
+
+
+class UrlCanonicalizer(object):
+    """
+    Rewrites equivalent urls to one form so they are checked once. ``rules`` selects the rewrites, all but
+    trailing_slash by default:
+
+    - fragment: drops the ``#fragment``
+    - trailing_slash: drops trailing slashes of the path
+    - host_case: lowercases the scheme and the host
+    - default_port: drops :80 for http and :443 for https
+    - tracking_params: drops query parameters in ``tracking_params``, names ending with * match by prefix
+    """
+    default_ports = {'http': 80, 'https': 443}
+
+    def __init__(self, rules=DEFAULT_CANONICAL_RULES, tracking_params=DEFAULT_TRACKING_PARAMS):
+        unknown = set(rules) - set(CANONICAL_RULES)
+        if unknown:
+            raise ValueError('unknown canonical url rules %s' % sorted(unknown))
+        self.rules = tuple(rules)
+        self.tracking_params = tracking_params
+        self._prefixes = tuple(param[:-1] for param in tracking_params if param.endswith('*'))
+        self._names = set(param for param in tracking_params if not param.endswith('*'))
+
+    def __repr__(self):
+        return 'UrlCanonicalizer(%r, %r)' % (self.rules, self.tracking_params)
+
+    def _is_tracking(self, pair):
+        name = pair.split('=', 1)[0]
+        return name in self._names or name.startswith(self._prefixes)
+
+    def _netloc(self, parts):
+        netloc = parts.netloc
+        if 'host_case' in self.rules:
+            userinfo, at, host = netloc.rpartition('@')
+            netloc = userinfo + at + host.lower()
+        if 'default_port' in self.rules:
+            port = ':%s' % self.default_ports.get(parts.scheme.lower())
+            if netloc.endswith(port):
+                netloc = netloc[:-len(port)]
+        return netloc
+
+    def canonical(self, url):
+        if not self.rules:
+            return url
+        try:
+            parts = urlsplit(url)
+        except ValueError:
+            return url
+        scheme = parts.scheme.lower() if 'host_case' in self.rules else parts.scheme
+        path = parts.path.rstrip('/') if 'trailing_slash' in self.rules else parts.path
+        query = parts.query
+        if 'tracking_params' in self.rules and query:
+            query = '&'.join(pair for pair in query.split('&') if not self._is_tracking(pair))
+        fragment = '' if 'fragment' in self.rules else parts.fragment
+        return urlunsplit((scheme, self._netloc(parts), path, query, fragment))
+
+
+class RetryPolicy(object):
+    """
+    Decides if and when a request is retried. Requests with a status in ``statuses`` are retried up to
+    ``max_count`` attempts in total with exponential backoff starting at ``backoff`` seconds, up to
+    ``max_backoff``. With ``jitter`` the delay is randomized between half and the full backoff. A Retry-After
+    header sent by the server is respected up to ``max_retry_after`` seconds.
+
+    Any object with ``retry(status, attempt)`` and ``delay(attempt, retry_after)`` can be used as a policy.
+    """
+
+    def __init__(self, max_count=3, backoff=0.5, max_backoff=30, jitter=True, statuses=(429, 500, 502, 503, 504),
+                 max_retry_after=60):
+        self.max_count = max_count
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.statuses = statuses
+        self.max_retry_after = max_retry_after
+
+    def retry(self, status, attempt):
+        return status in self.statuses and attempt < self.max_count
+
+    def delay(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return min(retry_after, self.max_retry_after)
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        if self.jitter:
+            delay = random.uniform(delay / 2, delay)
+        return delay
+
+
+def _retry_after(value):
+    """
+    Returns seconds to wait from a Retry-After header given as seconds or a http date.
+    """
+    if not isinstance(value, str):
+        return None
+    if value.strip().isdigit():
+        return int(value)
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+class HostScheduler(object):
+    """
+    Keeps requests to a single host within ``concurrency`` requests at a time and ``rate`` requests per second
+    (None means no rate limit). Urls of a busy or rate limited host are parked until ``ready`` lets them through,
+    a rate limited host waits for a single wake up at a time.
+    """
+
+    def __init__(self, concurrency=4, rate=None):
+        self.concurrency = concurrency
+        self.rate = rate
+        self._active = defaultdict(int)
+        self._next_start = defaultdict(float)
+        self._parked = defaultdict(deque)
+        self._waking = set()
+
+    def reserve(self, host, now):
+        """
+        Returns 0 and takes a slot when a request to the host can start now, the number of seconds to wait when
+        the host is rate limited or None when all slots of the host are taken.
+        """
+        if self._active[host] >= self.concurrency:
+            return None
+        wait = self._next_start[host] - now
+        if wait > 0:
+            return wait
+        self._active[host] = self._active[host] + 1
+        if self.rate:
+            self._next_start[host] = now + 1 / self.rate
+        return 0
+
+    def park(self, host, item):
+        self._parked[host].append(item)
+
+    def release(self, host):
+        self._active[host] = self._active[host] - 1
+
+    def drop(self, host):
+        """
+        Removes and returns the parked items of the host.
+        """
+        return self._parked.pop(host, ())
+
+    def ready(self, host, now):
+        """
+        Returns a tuple of the parked item which can start now and the number of seconds after which the host
+        should be woken up, when it's rate limited and no wake up is pending. Both are None otherwise.
+        """
+        parked = self._parked[host]
+        if not parked or host in self._waking or self._active[host] >= self.concurrency:
+            return None, None
+        wait = self._next_start[host] - now
+        if wait > 0:
+            self._waking.add(host)
+            return None, wait
+        return parked.popleft(), None
+
+    def woken(self, host):
+        self._waking.discard(host)
+
+
+def _interleave(urls):
+    """
+    Yields indexes and urls ordered round robin by host so consecutive requests go to different hosts.
+    """
+    hosts = OrderedDict()
+    for index, url in enumerate(urls):
+        hosts.setdefault(urlparse(url).netloc, []).append((index, url))
+    for group in zip_longest(*hosts.values()):
+        for item in group:
+            if item is not None:
+                yield item
+
+
+class CircuitBreaker(object):
+    """
+    Stops requests to a host after ``threshold`` consecutive failures to reach it. After ``reset_timeout``
+    seconds a single probe request is let through, the host is closed again if it succeeds.
+    """
+
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._failures = defaultdict(int)
+        self._opened = {}
+        self._probing = set()
+
+    def allow(self, host, now):
+        opened = self._opened.get(host)
+        if opened is None:
+            return True
+        if host in self._probing or now < opened + self.reset_timeout:
+            return False
+        self._probing.add(host)
+        return True
+
+    def success(self, host):
+        self._failures.pop(host, None)
+        self._opened.pop(host, None)
+        self._probing.discard(host)
+
+    def cancel(self, host):
+        """
+        Ends a probe whose request failed for a reason other than the host, without closing or opening it.
+        """
+        self._probing.discard(host)
+
+    def failure(self, host, now):
+        self._failures[host] = self._failures[host] + 1
+        if host in self._probing or self._failures[host] >= self.threshold:
+            if host not in self._opened:
+                logging.warning('%s failed %s times, skipping its urls', host, self._failures[host])
+            self._opened[host] = now
+        self._probing.discard(host)
+
+
+class UrlCheckStats(object):
+    """
+    Time requests spent waiting in the queue and time spent on the requests, retries are counted separately.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.request_time = 0.0
+        self.max_request_time = 0.0
+
+    def __str__(self):
+        count = self.count or 1
+        return '%s requests, queue wait avg %.3fs max %.3fs, request avg %.3fs max %.3fs' % (
+            self.count, self.wait_time / count, self.max_wait_time, self.request_time / count, self.max_request_time)
+
+    def add(self, wait_time, request_time):
+        self.count = self.count + 1
+        self.wait_time = self.wait_time + wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        self.request_time = self.request_time + request_time
+        self.max_request_time = max(self.max_request_time, request_time)
+
+
 class UrlStatusChecker(object):
+    """
+    Checks status codes of urls with ``concurrency`` workers sharing one session, probing with HEAD first and
+    falling back to GET for hosts that reject it.
+    """
     retry_max_count = 3
+    head_fallback_statuses = (501, )
 
-    def __init__(self, headers=None):
+    def __init__(self, headers=None, limit=100, limit_per_host=10, dns_ttl=300, concurrency=50, cache=None,
+                 cache_ttls=DEFAULT_URL_TTLS, retry_policy=None, host_concurrency=None, host_rate=None,
+                 connect_timeout=10, read_timeout=30, budget=None, breaker_threshold=5, breaker_reset=30,
+                 cassette=None, cassette_mode='replay'):
         self._headers = headers or {}
         if 'User-Agent' not in self._headers:
             self._headers['User-Agent'] = DEFAULT_USER_AGENT
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.dns_ttl = dns_ttl
+        self.concurrency = concurrency
+        self.cache = cache
+        self.cache_ttls = cache_ttls
+        self.retry_policy = retry_policy or RetryPolicy(self.retry_max_count)
+        self.host_concurrency = host_concurrency or limit_per_host or concurrency
+        self.host_rate = host_rate
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.budget = budget
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        if cassette_mode not in CASSETTE_MODES:
+            raise ValueError('cassette mode must be one of %s' % (CASSETTE_MODES, ))
+        self.cassette = cassette
+        self.cassette_mode = cassette_mode
+        self.stats = UrlCheckStats()
+        self._session = None
+        self._head_rejecting_hosts = set()
+
+    def _create_session(self):
+        connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.limit_per_host,
+                                         use_dns_cache=True, ttl_dns_cache=self.dns_ttl)
+        timeout = aiohttp.ClientTimeout(connect=self.connect_timeout, sock_read=self.read_timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    def _request(self, method, url):
+        res = yield from self._session.request(method, url, headers=self._headers)
+        if method == 'head':
+            # release is synchronous, its result is only awaitable for backward compatibility
+            res.release()
+        else:
+            # closing the connection instead of releasing it doesn't read the body
+            res.close()
+        return res.status, _retry_after(res.headers.get('Retry-After'))
+
+    def _rejects_head(self, status):
+        return status in self.head_fallback_statuses or (400 <= status < 500 and status != 429)
 
     def _make_request(self, url):
-        res = None
-        try:
-            logging.info('checking {}'.format(url))
-            res = yield from aiohttp.request('get', url, headers=self._headers)
-            return res.status
-        except Exception:
-            logging.error('Error making request to %s', url)
-            return 500
-        finally:
-            if res:
-                res.close()
-
-    def _retry_request(self, url, status):
-        new_status = status
-        times = 1
-        while times < self.retry_max_count and status == new_status:
-            new_status = yield from self._make_request(url)
-            times = times + 1
-        return new_status
-
-    def _request_status_code(self, url):
-        status = yield from self._make_request(url)
-        if status == 500:
-            return (yield from self._retry_request(url, status))
-        return status
+        """
+        Returns the status code and the number of seconds the server asked to wait before retrying. Raises when
+        the host could not be reached.
+        """
+        logging.info('checking {}'.format(url))
+        host = urlparse(url).netloc
+        status = None
+        if host not in self._head_rejecting_hosts:
+            try:
+                status, retry_after = yield from self._request('head', url)
+                if not self._rejects_head(status):
+                    return status, retry_after
+            except asyncio.TimeoutError:
+                # GET would most likely time out as well
+                raise
+            except Exception:
+                logging.info('HEAD request to %s failed', url)
+        get_status, retry_after = yield from self._request('get', url)
+        if status is not None and get_status != status:
+            self._head_rejecting_hosts.add(host)
+        return get_status, retry_after
 
     def _has_disallowed_chars(self, url):
         return url.find('\u200e') != -1
@@ -127,12 +542,146 @@ class UrlStatusChecker(object):
     def _is_valid(self, status_code, has_disallowed_chars):
         return (200 <= status_code < 300) and not has_disallowed_chars
 
+    @asyncio.coroutine
+    def _worker(self, queue, results, state):
+        loop = asyncio.get_event_loop()
+        scheduler = state['scheduler']
+        breaker = state['breaker']
+
+        def put_later(delay, item):
+            loop.call_later(delay, lambda: queue.put_nowait(item))
+
+        def wake(host):
+            item, delay = scheduler.ready(host, loop.time())
+            if item is not None:
+                queue.put_nowait(item)
+            elif delay is not None:
+                loop.call_later(delay, woken, host)
+
+        def woken(host):
+            scheduler.woken(host)
+            wake(host)
+
+        def release(host):
+            scheduler.release(host)
+            wake(host)
+
+        def finish(index, status):
+            results[index] = status
+            state['pending'] = state['pending'] - 1
+            if state['pending'] == 0:
+                for _ in range(state['workers']):
+                    queue.put_nowait(None)
+
+        while True:
+            item = yield from queue.get()
+            if item is None:
+                return
+            index, url, attempt, queued = item
+            host = urlparse(url).netloc
+            # skipped urls don't wait for the host's slots, nor do its parked urls
+            if not breaker.allow(host, loop.time()):
+                finish(index, HOST_UNAVAILABLE)
+                for parked in scheduler.drop(host):
+                    finish(parked[0], HOST_UNAVAILABLE)
+                continue
+            if scheduler.reserve(host, loop.time()) != 0:
+                # the probe is let through again when the url is woken
+                breaker.cancel(host)
+                scheduler.park(host, item)
+                wake(host)
+                continue
+            wake(host)
+            started = loop.time()
+            try:
+                status, retry_after = yield from self._make_request(url)
+                breaker.success(host)
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                logging.error('Cannot reach %s', url)
+                status, retry_after = 500, None
+                breaker.failure(host, loop.time())
+            except Exception:
+                logging.error('Error making request to %s', url)
+                status, retry_after = 500, None
+                breaker.cancel(host)
+            finally:
+                release(host)
+            self.stats.add(started - queued, loop.time() - started)
+            if self.retry_policy.retry(status, attempt):
+                delay = self.retry_policy.delay(attempt, retry_after)
+                logging.info('retrying %s in %.2fs', url, delay)
+                put_later(delay, (index, url, attempt + 1, loop.time() + delay))
+                continue
+            finish(index, status)
+
+    @asyncio.coroutine
+    def _request_status_codes(self, urls):
+        if not urls:
+            return {}
+        loop = asyncio.get_event_loop()
+        queue = asyncio.Queue()
+        for index, url in _interleave(urls):
+            queue.put_nowait((index, url, 1, loop.time()))
+        results = [UNCHECKED] * len(urls)
+        state = {
+            'pending': len(urls),
+            'workers': min(self.concurrency, len(urls)),
+            'scheduler': HostScheduler(self.host_concurrency, self.host_rate),
+            'breaker': CircuitBreaker(self.breaker_threshold, self.breaker_reset),
+        }
+        self.stats = UrlCheckStats()
+        self._session = self._create_session()
+        try:
+            workers = [self._worker(queue, results, state) for _ in range(state['workers'])]
+            yield from asyncio.wait_for(asyncio.gather(*workers), self.budget)
+        except asyncio.TimeoutError:
+            logging.warning('%s urls left unchecked after %ss', state['pending'], self.budget)
+        finally:
+            yield from self._session.close()
+            self._session = None
+        logging.info('checked %s', self.stats)
+        return dict(zip(urls, results))
+
+    @asyncio.coroutine
+    def _status_codes(self, urls):
+        if self.cassette is None:
+            return (yield from self._cached_status_codes(urls))
+        cassette = UrlCassette(self.cassette)
+        if self.cassette_mode == 'replay':
+            statuses = cassette.get_many(urls)
+            if len(statuses) < len(urls):
+                logging.warning('%s urls are not recorded in %s', len(urls) - len(statuses), self.cassette)
+            return {url: statuses.get(url, NOT_RECORDED) for url in urls}
+        statuses = yield from self._cached_status_codes(urls)
+        cassette.set_many({url: status for url, status in statuses.items() if not isinstance(status, str)})
+        cassette.save()
+        return statuses
+
+    @asyncio.coroutine
+    def _cached_status_codes(self, urls):
+        if self.cache is None:
+            return (yield from self._request_status_codes(urls))
+        cache = UrlCache(self.cache, self.cache_ttls)
+        try:
+            statuses = cache.get_many(urls)
+            logging.info('%s of %s urls cached', len(statuses), len(urls))
+            new_statuses = yield from self._request_status_codes([url for url in urls if url not in statuses])
+            cache.set_many({url: status for url, status in new_statuses.items() if not isinstance(status, str)})
+        finally:
+            cache.close()
+        statuses.update(new_statuses)
+        return statuses
+
     @asyncio.coroutine
     def _check_urls_coro(self, urls, future):
-        tasks = [self._request_status_code(url.url) for url in urls]
-        results = yield from asyncio.gather(*tasks)
-        for index, url in enumerate(urls):
-            url.status_code = results[index]
+        urls = list(urls)
+        statuses = yield from self._status_codes([url.url for url in urls])
+        for url in urls:
+            status = statuses[url.url]
+            if isinstance(status, str):
+                url.status_code, url.reason = None, status
+            else:
+                url.status_code = status
             url.has_disallowed_chars = self._has_disallowed_chars(url.url)
         invalid_urls = filter(lambda u: not u.is_valid(), urls)
         future.set_result(list(invalid_urls))
@@ -153,36 +702,57 @@ class UrlStatusChecker(object):
 
 
 class UrlValidator(object):
+    """
+    Checks urls found in the files. Urls equal after ``canonical_rules`` (see ``UrlCanonicalizer``) are checked
+    once, as the first of them is written, and reported for all files they are in.
+    """
     _extractors = {'txt': TextUrlExtractor, 'html': HtmlUrlExtractor}
 
-    def __init__(self, filetype, headers={}, **kwargs):
-        self.client_headers = headers
+    def __init__(self, filetype, headers={}, canonical_rules=DEFAULT_CANONICAL_RULES,
+                 tracking_params=DEFAULT_TRACKING_PARAMS, **kwargs):
         extractor_class = self._extractors.get(filetype)
         if extractor_class is None:
             raise MissingUrlExtractorError('no extractor for filetype %s', filetype)
-        self.extractor = extractor_class(**kwargs)
+        extractor_options = {key: kwargs.pop(key) for key in extractor_class.options if key in kwargs}
+        self.extractor = extractor_class(**extractor_options)
+        self.client_headers = headers
+        self.checker_options = kwargs
+        self.canonicalizer = UrlCanonicalizer(canonical_rules, tracking_params)
+        # fails early on options the checker doesn't know
+        self.checker = self._checker()
+
+    def _checker(self):
+        self.checker = UrlStatusChecker(headers=self.client_headers, **self.checker_options)
+        return self.checker
+
+    def __repr__(self):
+        options = sorted(vars(self.extractor).items())
+        headers = sorted(self.client_headers.items())
+        return 'UrlValidator(%s, %r, %r, %r)' % (type(self.extractor).__name__, options, headers, self.canonicalizer)
 
     def _get_urls(self, data, parser, reader):
-        flat_data = set(p for sublist in data for p in sublist)
+        flat_data = OrderedDict.fromkeys(p for sublist in data for p in sublist)
         # TODO yield instead
         urls = {}
         for element in flat_data:
-            content = parser.parse(reader.read(element))
+            content = flatten(parser.parse(reader.read(element)))
             file_urls = self.extractor.extract_urls(content)
             for file_url in file_urls:
-                url = urls.get(file_url, UrlDiff(file_url))
-                url.add_file(element)
-                urls[url.url] = url
+                # the first url of the canonical group is requested and reported as it's written in the file
+                canonical_url = self.canonicalizer.canonical(file_url)
+                url = urls.get(canonical_url)
+                if url is None:
+                    url = urls[canonical_url] = UrlDiff(file_url)
+                if element not in url.files:
+                    url.add_file(element)
         return urls
 
     def check(self, data, parser, reader):
         urls = self._get_urls(data, parser, reader)
-        checker = UrlStatusChecker(headers=self.client_headers)
-        invalid_urls = checker.check(urls.values())
+        invalid_urls = self._checker().check(urls.values())
         return invalid_urls
 
     def async_check(self, data, parser, reader):
         urls = self._get_urls(data, parser, reader)
-        checker = UrlStatusChecker(headers=self.client_headers)
-        invalid_urls = yield from checker.async_check(urls.values())
+        invalid_urls = yield from self._checker().async_check(urls.values())
         return invalid_urls
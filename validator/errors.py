@@ -2,22 +2,34 @@ from collections import namedtuple
 
 
 class UrlDiff(object):
+    """
+    Url found in ``files``. Urls which were not requested have no status code and ``reason`` says why.
+    """
 
-    def __init__(self, url, files=None, status_code=200, has_disallowed_chars=False):
+    def __init__(self, url, files=None, status_code=200, has_disallowed_chars=False, reason=None):
         self.url = url
         self.files = files or []
         self.status_code = status_code
         self.has_disallowed_chars = has_disallowed_chars
+        self.reason = reason
 
     def __str__(self):
-        return 'Url(%s, %s, %s, %s)' % (self.url, self.files, self.status_code, self.has_disallowed_chars)
+        return 'Url(%s, %s, %s, %s)' % (self.url, self.files, self.status_code or self.reason,
+                                        self.has_disallowed_chars)
 
     def __repr__(self):
         return 'Url: %s' % self.url
 
     def is_valid(self):
+        if self.reason is not None:
+            return False
         return 200 <= self.status_code < 300 and not self.has_disallowed_chars
 
+    def status(self):
+        if self.reason is not None:
+            return 'was {}'.format(self.reason)
+        return 'returned with code {}'.format(self.status_code)
+
     def add_file(self, path):
         self.files.append(path)
 
@@ -28,7 +40,8 @@ ContentData.__new__.__defaults__ = ('', ) * 2
 
 class MdDiff(object):
 
-    def __init__(self, base, other, error_msgs):
+    def __init__(self, base, other, error_msgs, key=None):
         self.base = base
         self.other = other
         self.error_msgs = error_msgs
+        self.key = key
@@ -1,79 +1,177 @@
 from pathlib import Path
 from string import Formatter
-from collections import defaultdict
+from collections import OrderedDict
+from fnmatch import translate
+import os
+import re
 import parse
 import logging
+from os import scandir
 
 logger = logging.getLogger(__name__)
 
+_MAGIC_CHARS = re.compile('[*?[]')
+
 
 def read_content(path):
-    if path.exists():
+    try:
         with path.open() as fp:
             return fp.read()
-    else:
-        logger.warn('%s does not exist', path.resolve())
+    except FileNotFoundError:
+        logger.warning('%s does not exist', path.absolute())
         return ''
 
 
 def save_report(directory, source_path, report):
     rel_path = Path(str(source_path).replace('../', ''))
     path = Path(directory).joinpath(rel_path.with_suffix('.html'))
-    try:
-        path.parent.mkdir(parents=True)
-    except FileExistsError:
-        pass
+    os.makedirs(str(path.parent), exist_ok=True)
     with path.open('w') as fp:
         fp.write(report)
 
 
-def _no_params_pattern(pattern):
-    yield list(Path().glob(pattern))
+def _compile_segments(parts):
+    segments = []
+    for part in parts:
+        if part == '**':
+            segments.append(('recursive', None))
+        elif _MAGIC_CHARS.search(part):
+            segments.append(('wildcard', re.compile(translate(part)).match))
+        else:
+            segments.append(('precise', part))
+    return segments
+
 
+def _entries(directory):
+    try:
+        return sorted(scandir(directory or '.'), key=lambda entry: entry.name)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return []
 
-def _get_param_values(pattern, paths):
-    values = []
-    wildcard_paths = set()
-    parser = parse.compile(pattern)
 
+def _is_dir(entry):
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _dirs(directory):
+    yield directory
+    for entry in _entries(directory):
+        if _is_dir(entry):
+            yield from _dirs(os.path.join(directory, entry.name))
+
+
+def _select(directory, segments, index):
+    kind, value = segments[index]
+    last = index == len(segments) - 1
+    if kind == 'precise':
+        path = os.path.join(directory, value)
+        if last:
+            if os.path.exists(path):
+                yield path
+        elif os.path.isdir(path):
+            yield from _select(path, segments, index + 1)
+    elif kind == 'wildcard':
+        for entry in _entries(directory):
+            if value(entry.name):
+                path = os.path.join(directory, entry.name)
+                if last:
+                    yield path
+                elif _is_dir(entry):
+                    yield from _select(path, segments, index + 1)
+    else:
+        for path in _dirs(directory):
+            if last:
+                yield path
+            else:
+                yield from _select(path, segments, index + 1)
+
+
+def _walk(pattern):
+    """
+    Yields the paths matching a ``Path.glob`` like pattern, every directory is listed only once per pattern segment.
+    """
+    pattern = Path(pattern)
+    if pattern.is_absolute():
+        root, parts = pattern.anchor, pattern.parts[1:]
+    else:
+        root, parts = '', pattern.parts
+    if not parts:
+        return
+    segments = _compile_segments(parts)
+    paths = _select(root, segments, 0)
+    if sum(1 for kind, _ in segments if kind == 'recursive') > 1:
+        paths = OrderedDict.fromkeys(paths)
     for path in paths:
-        result = parser.parse(str(path))
-        wildcard_paths.add(result.fixed)
-        values.append(result.named)
+        yield Path(path)
 
-    return values, wildcard_paths
 
+def _params(pattern):
+    return [p for p in map(lambda e: e[1], Formatter().parse(pattern)) if p]
+
+
+def _no_params_pattern(pattern):
+    yield list(_walk(pattern))
 
-def _params_pattern(pattern, params, **kwargs):
-    files = defaultdict(list)
 
-    # change parameters for wildcards so we can use it in glob
+def _params_pattern(pattern, params, **kwargs):
+    # change parameters for wildcards so we can walk the tree once
     wildcard_params = {k: '*' for k in params}
     wildcard_pattern = pattern.format(**wildcard_params)
-    if Path(wildcard_pattern).is_absolute():
-        rel_wildcard_pattern = str(Path(wildcard_pattern).relative_to('/'))
-        paths = list(Path('/').glob(rel_wildcard_pattern))
-    else:
-        paths = list(Path().glob(wildcard_pattern))
 
-    # get all available values for params and wildcards
+    # index all available wildcard parts and parameter values, ordered dicts are used as ordered sets
     parse_pattern = pattern.replace('**', '{}').replace('*', '{}')
-    param_values, wildcard_paths = _get_param_values(parse_pattern, paths)
+    parser = parse.compile(parse_pattern)
+    wildcard_paths = OrderedDict()
+    param_values = OrderedDict()
+    for path in _walk(wildcard_pattern):
+        result = parser.parse(str(path))
+        if result is None:
+            continue
+        wildcard_paths[result.fixed] = None
+        param_values.setdefault(tuple(sorted(result.named.items())), result.named)
 
     for wildcard_path in wildcard_paths:
         base_path = Path(parse_pattern.format(*wildcard_path, **kwargs))
-        for values in param_values:
-            other_path = Path(parse_pattern.format(*wildcard_path, **values))
-            if other_path != base_path and other_path not in files[base_path]:
-                files[base_path].append(other_path)
+        group = OrderedDict([(base_path, None)])
+        for values in param_values.values():
+            group.setdefault(Path(parse_pattern.format(*wildcard_path, **values)), None)
+        yield list(group)
 
-    for k, v in files.items():
-        result = list(v)
-        result.insert(0, k)
-        yield result
 
+def _stream_params_pattern(pattern, params, **kwargs):
+    wildcard_params = {k: '*' for k in params}
 
-def files(pattern, **kwargs):
+    # parameter values are taken from the shortest part of the pattern containing all parameters, for the usual
+    # layout like 'res/values-{lang}/*.xml' this lists only the directories
+    parts = Path(pattern).parts
+    last = max(index for index, part in enumerate(parts) if _params(part))
+    prefix = str(Path(*parts[:last + 1]))
+    prefix_parser = parse.compile(prefix.replace('**', '{}').replace('*', '{}'))
+    param_values = OrderedDict()
+    for path in _walk(prefix.format(**wildcard_params)):
+        if last < len(parts) - 1 and not path.is_dir():
+            continue
+        result = prefix_parser.parse(str(path))
+        if result is not None:
+            param_values.setdefault(tuple(sorted(result.named.items())), result.named)
+
+    # groups are yielded as soon as the base file is found
+    parse_pattern = pattern.replace('**', '{}').replace('*', '{}')
+    parser = parse.compile(parse_pattern)
+    for base_path in _walk(pattern.format(**kwargs)):
+        result = parser.parse(str(base_path))
+        if result is None:
+            continue
+        group = OrderedDict([(base_path, None)])
+        for values in param_values.values():
+            group.setdefault(Path(parse_pattern.format(*result.fixed, **values)), None)
+        yield list(group)
+
+
+def files(pattern, stream=False, **kwargs):
     """
     Return list of list of `Path <https://docs.python.org/3/library/pathlib.html#pathlib.Path>`_ to
     files matching the pattern.
@@ -89,12 +187,18 @@ def files(pattern, **kwargs):
     [[Path(path/to/file1.txt), Path(path/to/file2.txt)]]
     parameter wildcard pattern, default name=file1: 'path/*/{name}.txt' will resolve
     [[Path(path/to1/file1.txt), Path(path/to1/file2.txt)], [Path(path/to2/file1.txt), Path(path/to2/file2.txt)]]
+
+    With ``stream=True`` the groups are yielded while the tree is being walked. A group is started by every file
+    matching the default parameters, the other parameter values are taken from the directories matching the
+    pattern up to the last parameter. Without parameters all files are a single group either way.
     """
     # extract named parameters from the pattern
-    params = [p for p in map(lambda e: e[1], Formatter().parse(pattern)) if p]
+    params = _params(pattern)
     if params:
         if len(params - kwargs.keys()) > 0:
             raise ValueError('missing parameters {} for pattern {}'.format(params - kwargs.keys(), pattern))
+        if stream:
+            return _stream_params_pattern(pattern, params, **kwargs)
         return _params_pattern(pattern, params, **kwargs)
     else:
         return _no_params_pattern(pattern)
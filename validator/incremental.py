@@ -0,0 +1,161 @@
+import os
+import pickle
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+
+from .errors import UrlDiff, MdDiff
+from .parsers import ContentStore
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 1
+
+
+def _row_key(row):
+    return tuple(str(path) for path in row)
+
+
+def _row_digest(row, reader):
+    digest = hashlib.sha1()
+    for path in row:
+        content = reader.read(path)
+        digest.update(('%s\0%r\0' % (path, content)).encode('utf-8', 'surrogatepass'))
+    return digest.hexdigest()
+
+
+def _row_errors(row, errors):
+    """
+    Returns errors which belong to the row, url errors are narrowed down to the files in the row.
+    """
+    paths = set(row)
+    result = []
+    for error in errors:
+        if isinstance(error, UrlDiff):
+            files = [path for path in error.files if path in paths]
+            if files:
+                result.append(UrlDiff(error.url, files, error.status_code, error.has_disallowed_chars, error.reason))
+        elif isinstance(error, MdDiff):
+            if error.base.original == row[0] and error.other.original in paths:
+                result.append(error)
+    return result
+
+
+def _merge_errors(errors):
+    """
+    Merges url errors for the same url coming from different rows.
+    """
+    result = []
+    urls = {}
+    for error in errors:
+        if isinstance(error, UrlDiff):
+            if error.url in urls:
+                url = urls[error.url]
+                url.files.extend(path for path in error.files if path not in url.files)
+                continue
+            error = urls[error.url] = UrlDiff(error.url, list(error.files), error.status_code,
+                                              error.has_disallowed_chars, error.reason)
+        result.append(error)
+    return result
+
+
+class Manifest(object):
+    """
+    Results of the previous run stored per row together with the digest of the row's files.
+
+    The manifest is discarded when the checks or the parsers change.
+    """
+
+    def __init__(self, path, signature):
+        self.path = path
+        self.signature = signature
+        self.rows = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'rb') as fp:
+                data = pickle.load(fp)
+        except FileNotFoundError:
+            return
+        except Exception:
+            logger.warning('invalid manifest %s, running full validation', self.path)
+            return
+        if data.get('version') == MANIFEST_VERSION and data.get('signature') == self.signature:
+            self.rows = data['rows']
+
+    def get(self, key, digest):
+        """
+        Returns errors recorded for the row or None if the row changed since the last run.
+        """
+        entry = self.rows.get(key)
+        if entry is not None and entry[0] == digest:
+            return entry[1]
+        return None
+
+    def save(self, rows):
+        data = {'version': MANIFEST_VERSION, 'signature': self.signature, 'rows': rows}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            pickle.dump(data, fp, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+        self.rows = rows
+
+
+class IncrementalCheck(object):
+    """
+    Runs the wrapped check only for rows whose files changed since the previous run and replays the recorded
+    errors for the others.
+    """
+
+    def __init__(self, check, manifest_path):
+        self.chain = check
+        self.manifest_path = manifest_path
+
+    def _prepare(self, contents, parser, reader):
+        store = ContentStore.of(parser, reader)
+        manifest = Manifest(self.manifest_path, '%r\0%r' % (self.chain, parser))
+        rows = OrderedDict()
+        changed = []
+        # paths of the changed rows, contents of the others are not kept for the check
+        checked = set()
+        for row in contents:
+            row = list(row)
+            key = _row_key(row)
+            digest = _row_digest(row, store)
+            errors = manifest.get(key, digest)
+            rows[key] = (row, digest, errors)
+            if errors is None:
+                changed.append(row)
+                checked.update(row)
+            else:
+                store.drop(path for path in row if path not in checked)
+        logger.info('%s of %s rows changed', len(changed), len(rows))
+        return manifest, rows, changed, store
+
+    def _finish(self, manifest, rows, new_errors):
+        errors = []
+        entries = {}
+        for key, (row, digest, row_errors) in rows.items():
+            if row_errors is None:
+                row_errors = _row_errors(row, new_errors)
+            # urls which were not checked, e.g. out of the time budget, are checked again on the next run
+            if not any(isinstance(error, UrlDiff) and error.reason is not None for error in row_errors):
+                entries[key] = (digest, row_errors)
+            errors.extend(row_errors)
+        manifest.save(entries)
+        return _merge_errors(errors)
+
+    def check(self, contents, parser, reader):
+        manifest, rows, changed, store = self._prepare(contents, parser, reader)
+        new_errors = self.chain.check(changed, store, store) if changed else []
+        return self._finish(manifest, rows, new_errors)
+
+    def async_check(self, contents, parser, reader):
+        manifest, rows, changed, store = self._prepare(contents, parser, reader)
+        new_errors = []
+        if changed:
+            new_errors = yield from self.chain.async_check(changed, store, store)
+        return self._finish(manifest, rows, new_errors)
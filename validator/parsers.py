@@ -1,5 +1,13 @@
+import csv
+import threading
 import markdown
 import xml.etree.ElementTree as ET
+from io import BytesIO
+from lxml import etree
+from collections import deque, OrderedDict, Counter
+from collections.abc import Mapping
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 from .fs import read_content
 
@@ -9,49 +17,312 @@ class ParserError(Exception):
         super().__init__(msg)
 
 
+def align(base, other):
+    """
+    Yields tuples of key, base and other content. Keyed contents are aligned by key, keys missing in the other
+    content are skipped. Not keyed contents are yielded as a single tuple with None key.
+    """
+    if isinstance(base, Mapping):
+        if not isinstance(other, Mapping):
+            return
+        for key, base_value in base.items():
+            other_value = other.get(key)
+            if other_value is not None:
+                yield key, base_value, other_value
+    else:
+        yield None, base, other
+
+
+def flatten(content):
+    """
+    Joins keyed content into a single text.
+    """
+    if isinstance(content, Mapping):
+        return '\n\n'.join(content.values())
+    return content
+
+
 class FileReader(object):
     def read(self, path):
         return read_content(path)
 
 
+class PrefetchReader(object):
+    """
+    Reads files of the upcoming rows in a pool of threads so the I/O overlaps with parsing and checking.
+
+    The rows need to go through ``prefetch`` before they are checked, at most ``window`` files are read ahead of
+    the row being checked.
+    """
+
+    def __init__(self, reader, workers=8, window=64):
+        self.reader = reader
+        self.workers = workers
+        self.window = window
+        self._pending = {}
+
+    def prefetch(self, contents):
+        rows = deque()
+        ahead = 0
+        with ThreadPoolExecutor(self.workers) as executor:
+            for row in contents:
+                row = list(row)
+                for path in row:
+                    if path not in self._pending:
+                        self._pending[path] = executor.submit(self.reader.read, path)
+                rows.append(row)
+                ahead = ahead + len(row)
+                while ahead > self.window and len(rows) > 1:
+                    row = rows.popleft()
+                    ahead = ahead - len(row)
+                    yield row
+            while rows:
+                yield rows.popleft()
+
+    def read(self, path):
+        future = self._pending.pop(path, None)
+        if future is None:
+            return self.reader.read(path)
+        return future.result()
+
+
 class TxtReader(object):
     def read(self, content):
         return content
 
 
+_converters = threading.local()
+
+
+def _markdown_converter():
+    converter = getattr(_converters, 'markdown', None)
+    if converter is None:
+        converter = _converters.markdown = markdown.Markdown()
+    return converter
+
+
+@lru_cache(maxsize=4096)
+def render_markdown(content):
+    """
+    Converts markdown to html. Every thread reuses one converter reset between documents and the html is
+    memoized so every distinct text is converted once.
+    """
+    return _markdown_converter().reset().convert(content)
+
+
 class MarkdownParser(object):
+    def __repr__(self):
+        return 'MarkdownParser()'
+
     def parse(self, content):
-        return markdown.markdown(content)
+        return render_markdown(content)
 
 
 class XmlParser(object):
-    def __init__(self, query='*'):
+    """
+    Extracts text of the elements matching the query. In the keyed mode the result is an ordered mapping from
+    the element's ``name`` attribute to its text so every string can be checked separately.
+    """
+
+    def __init__(self, query='*', keyed=False):
         self.query = query
+        self.keyed = keyed
+
+    def __repr__(self):
+        return 'XmlParser(%r, keyed=%r)' % (self.query, self.keyed)
+
+    def _keyed(self, elements):
+        result = OrderedDict()
+        for index, element in enumerate(elements):
+            key = element.get('name') or str(index)
+            result[key] = (element.text or '').strip()
+        return result
+
+    def _elements(self, content):
+        return ET.fromstring(content).findall(self.query)
 
     def parse(self, content):
         content = content.strip()
         if not content:
-            return ''
-        elements = ET.fromstring(content).findall(self.query)
-        text_elements = [element.text.strip() for element in elements]
+            return OrderedDict() if self.keyed else ''
+        elements = self._elements(content)
+        if self.keyed:
+            return self._keyed(elements)
+        text_elements = [(element.text or '').strip() for element in elements]
         return '\n\n'.join(text_elements)
 
 
+class LxmlParser(XmlParser):
+    """
+    XmlParser backed by lxml, the query is a full XPath expression compiled once per parser.
+
+    With ``iterparse`` the query is a tag name of the root's children and the matching elements are read while the
+    document is being parsed and cleared right after, so the tree of a big resource file is never held in memory.
+    """
+
+    def __init__(self, query='*', keyed=False, iterparse=False):
+        super().__init__(query, keyed)
+        self.iterparse = iterparse
+        self._parser = etree.XMLParser(encoding='utf-8')
+        self._xpath = None if iterparse else etree.XPath(query)
+
+    def __repr__(self):
+        return 'LxmlParser(%r, keyed=%r, iterparse=%r)' % (self.query, self.keyed, self.iterparse)
+
+    def _iter_elements(self, content):
+        events = etree.iterparse(BytesIO(content), events=('end',), tag=self.query, encoding='utf-8')
+        for _, element in events:
+            # like the query of the tree parsers only children of the root are selected, not the root or deeper
+            parent = element.getparent()
+            if parent is None or parent.getparent() is not None:
+                continue
+            yield element
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+
+    def _elements(self, content):
+        content = content.encode('utf-8')
+        if self.iterparse:
+            return self._iter_elements(content)
+        return self._xpath(etree.fromstring(content, self._parser))
+
+
+def _lines(content):
+    start = 0
+    while start < len(content):
+        end = content.find('\n', start)
+        if end == -1:
+            end = len(content) - 1
+        yield content[start:end + 1]
+        start = end + 1
+
+
 class CsvParser(object):
+    """
+    Puts every csv value on a separate line. ``columns`` selects columns by index or by name, names are looked up
+    in the header row which is then skipped. Quoted values may contain the delimiter.
+    """
+
+    def __init__(self, columns=None, delimiter=','):
+        self.columns = columns
+        self.delimiter = delimiter
+
+    def __repr__(self):
+        return 'CsvParser(%r, %r)' % (self.columns, self.delimiter)
+
+    def _indexes(self, rows):
+        if not self.columns:
+            return None
+        if any(isinstance(column, str) for column in self.columns):
+            header = next(rows, [])
+            return [header.index(column) if isinstance(column, str) else column for column in self.columns]
+        return self.columns
+
+    def _values(self, content):
+        rows = csv.reader(_lines(content), delimiter=self.delimiter)
+        indexes = self._indexes(rows)
+        for row in rows:
+            if indexes is None:
+                yield from row
+            else:
+                for index in indexes:
+                    if index < len(row):
+                        yield row[index]
+
     def parse(self, content):
-        return '\n'.join(content.split(','))
+        return '\n'.join(self._values(content))
 
 
 class ChainParser(object):
+    """
+    Runs the parsers one after another, once the content is keyed the following parsers get every value.
+    """
+
     def __init__(self, parsers):
         self.parsers = parsers
 
+    def __repr__(self):
+        return 'ChainParser(%r)' % self.parsers
+
     def parse(self, content):
         original_content = content
         try:
             for parser in self.parsers:
-                content = parser.parse(content)
+                if isinstance(content, Mapping):
+                    content = OrderedDict((key, parser.parse(value)) for key, value in content.items())
+                else:
+                    content = parser.parse(content)
             return content
         except Exception as e:
             msg = 'error in content %s' % original_content
             raise ParserError(msg) from e
+
+
+class ContentStore(object):
+    """
+    Reads and parses every content once per validation run so all checks in a chain share the result.
+
+    The store has the same interface as the reader and the parser it wraps, raw content is cached by path
+    and parsed content by the raw content. Everything stays in memory until ``drop`` forgets it or ``releasing``
+    is set for the last check, from then on cached entries are dropped once used and new ones are not kept.
+    """
+
+    def __init__(self, parser, reader):
+        self.parser = parser
+        self.reader = reader
+        self.releasing = False
+        self._raw = {}
+        self._parsed = {}
+        # number of cached paths with the content, parsed content is released with the last of them
+        self._paths = Counter()
+
+    @classmethod
+    def of(cls, parser, reader):
+        """
+        Returns the store if both arguments are the same store already, otherwise wraps them in a new one.
+        """
+        if isinstance(reader, cls) and reader is parser:
+            return reader
+        return cls(parser, reader)
+
+    def read(self, path):
+        if self.releasing:
+            if path not in self._raw:
+                return self.reader.read(path)
+            content = self._raw.pop(path)
+            self._paths[content] = self._paths[content] - 1
+            return content
+        try:
+            return self._raw[path]
+        except KeyError:
+            content = self._raw[path] = self.reader.read(path)
+            self._paths[content] = self._paths[content] + 1
+            return content
+
+    def drop(self, paths):
+        """
+        Forgets the content of the paths, e.g. of files which won't be checked.
+        """
+        for path in paths:
+            if path not in self._raw:
+                continue
+            content = self._raw.pop(path)
+            self._paths[content] = self._paths[content] - 1
+            if self._paths[content] <= 0:
+                del self._paths[content]
+                self._parsed.pop(content, None)
+
+    def parse(self, content):
+        if self.releasing:
+            if content not in self._parsed:
+                return self.parser.parse(content)
+            if self._paths[content] > 0:
+                return self._parsed[content]
+            del self._paths[content]
+            return self._parsed.pop(content)
+        try:
+            return self._parsed[content]
+        except KeyError:
+            parsed = self._parsed[content] = self.parser.parse(content)
+            return parsed
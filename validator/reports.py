@@ -1,23 +1,18 @@
-from bs4 import BeautifulSoup
+import os
+import re
+import html
 import shutil
-import markdown
+from string import Template
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from .fs import save_report
 from .errors import UrlDiff, MdDiff
+from .parsers import render_markdown
 
 
-class HtmlReporter(object):
-    report_template = """
-<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"
-          "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
-
-<html>
-
-<head>
-    <meta http-equiv="Content-Type"
-          content="text/html; charset=ISO-8859-1" />
-    <title></title>
-    <style type="text/css">
+REPORT_STYLE = """
         table.diff {font-family:Courier; border:medium;}
         .diff_header {background-color:#e0e0e0}
         td.diff_header {text-align:right}
@@ -28,11 +23,9 @@ class HtmlReporter(object):
         ins {background-color: lightgreen;}
         del {background-color: red;}
         .info_text {margin-bottom: 15px;}
-    </style>
-</head>
-
-<body>
+"""
 
+REPORT_INFO = """
     <div class="info-text">
         <h3>KeepSafe's validation tool has found some problems with the translation</h3>
         <p>
@@ -45,7 +38,9 @@ class HtmlReporter(object):
             If you think the text is correct and the tool is still showing errors please contact KeepSafe's employee.
         </p>
     </div>
+"""
 
+REPORT_ENTRY = """
     <h4>This is how the text will look to the user</h4>
     <table class="diff" id="difflib_chg_to4__top"
            cellspacing="0" cellpadding="0" rules="groups" >
@@ -53,7 +48,10 @@ class HtmlReporter(object):
         <colgroup></colgroup> <colgroup></colgroup> <colgroup></colgroup>
 
         <tbody>
-        <tr><td width="50%"><p id="left_content"></p></td><td width="50%"><p id="right_content"></p></td></tr>
+        <tr>
+            <td width="50%"><p id="left_content">$left_content</p></td>
+            <td width="50%"><p id="right_content">$right_content</p></td>
+        </tr>
         </tbody>
     </table>
 
@@ -64,53 +62,205 @@ class HtmlReporter(object):
         <colgroup></colgroup> <colgroup></colgroup> <colgroup></colgroup>
 
         <tbody>
-        <tr><td width="50%"><p id="left_diff"></p></td><td width="50%"><p id="right_diff"></p></td></tr>
+        <tr>
+            <td width="50%"><p id="left_diff">$left_diff</p></td>
+            <td width="50%"><p id="right_diff">$right_diff</p></td>
+        </tr>
         </tbody>
     </table>
 
     <div>
         <h4>Errors found:</h4>
-        <p id="error_msgs"></p>
+        <p id="error_msgs">$error_msgs</p>
     </div>
 
-    <div id="urls"></div>
-</body>
+    <div id="urls">$urls</div>
+"""
+
+
+class HtmlReporter(object):
+    """
+    Saves a standalone html page for every file with errors.
+    """
+
+    report_template = """
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"
+          "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+
+<html>
+
+<head>
+    <meta http-equiv="Content-Type"
+          content="text/html; charset=ISO-8859-1" />
+    <title></title>
+    <style type="text/css">""" + REPORT_STYLE + """    </style>
+</head>
+
+<body>
+""" + REPORT_INFO + REPORT_ENTRY + """</body>
 </html>
 """
 
-    def __init__(self, output_directory='errors'):
+    template = Template(report_template)
+    slots = ('left_content', 'right_content', 'left_diff', 'right_diff', 'error_msgs', 'urls')
+
+    def __init__(self, output_directory='errors', workers=4, clean=True):
         self.output_directory = output_directory
+        self.workers = workers
+        self.clean = clean
 
-    def _add_content(self, soup, tag_id, content):
-        tags = soup.select('#{}'.format(tag_id))
+    def _source_path(self, error):
+        if getattr(error, 'key', None) is not None:
+            # dots would be taken for a suffix by save_report, Android maps them to underscores too
+            return Path(str(error.other.original), re.sub(r'[./\\]', '_', error.key))
+        return error.other.original
 
-        if tags and content:
-            tags[0].append(content)
-        else:
-            print('missing tag: %s, content %s' % (tag_id, content))
-        return soup
+    def _pages(self, errors):
+        """
+        Collects the content of every report page, url errors are listed on the page of every file they are in.
+        """
+        pages = OrderedDict()
+
+        def page(path):
+            return pages.setdefault(str(path), {slot: [] for slot in self.slots})
 
-    # TODO just rewrite !!!
-    # TODO remove isinstance
-    def report(self, errors):
-        shutil.rmtree(self.output_directory, ignore_errors=True)
         for error in errors:
-            # TODO save to different files for links and diff
-            # TODO use mustache for templates
-            report_soup = BeautifulSoup(self.report_template)
             if isinstance(error, UrlDiff):
-                messages = ['<span>{} returned with code {}</span>'.format(error.url, error.status_code)]
-                self._add_content(report_soup, 'urls', '\n'.join(messages))
+                message = '<span>{} {}</span>'.format(html.escape(error.url), html.escape(error.status()))
+                for path in error.files:
+                    page(path)['urls'].append(message)
             if isinstance(error, MdDiff):
-                error_msgs = '<br />'.join(map(lambda i: str(i), error.error_msgs))
-                base = markdown.markdown(error.base.parsed)
-                other = markdown.markdown(error.other.parsed)
-                report_soup = self._add_content(report_soup, 'left_content', BeautifulSoup(base).body)
-                report_soup = self._add_content(report_soup, 'right_content', BeautifulSoup(other).body)
-                report_soup = self._add_content(report_soup, 'left_diff', BeautifulSoup(error.base.diff).body)
-                report_soup = self._add_content(report_soup, 'right_diff', BeautifulSoup(error.other.diff).body)
-                report_soup = self._add_content(report_soup, 'error_msgs', BeautifulSoup(error_msgs).body)
-            save_report(self.output_directory, error.other.original, report_soup.prettify())
+                content = page(self._source_path(error))
+                content['left_content'].append(render_markdown(error.base.parsed))
+                content['right_content'].append(render_markdown(error.other.parsed))
+                content['left_diff'].append(error.base.diff)
+                content['right_diff'].append(error.other.diff)
+                content['error_msgs'].append('<br />'.join(html.escape(str(msg)) for msg in error.error_msgs))
+        return pages
+
+    def render(self, content):
+        return self.template.substitute({slot: '\n'.join(content[slot]) for slot in self.slots})
+
+    def _save(self, page):
+        path, content = page
+        save_report(self.output_directory, path, self.render(content))
+
+    def report(self, errors):
+        if self.clean:
+            shutil.rmtree(self.output_directory, ignore_errors=True)
+        pages = self._pages(errors)
+        with ThreadPoolExecutor(self.workers) as executor:
+            list(executor.map(self._save, pages.items()))
+
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9]+', '_', text).strip('_') or 'root'
+
+
+class ConsolidatedHtmlReporter(HtmlReporter):
+    """
+    Saves all errors into pages of at most ``page_size`` files per directory, with a shared stylesheet and an
+    index. The output directory is not wiped, only pages whose content changed are written and pages which are
+    no longer needed are removed, so a partial rerun rewrites only the affected pages.
+    """
+
+    page_template = Template("""<!DOCTYPE html>
+<html>
+
+<head>
+    <meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+    <title>$title</title>
+    <link rel="stylesheet" type="text/css" href="style.css" />
+</head>
+
+<body>
+    <p><a href="index.html">Index</a></p>
+""" + REPORT_INFO + """$entries</body>
+</html>
+""")
+    entry_template = Template("""
+<div class="entry" id="$anchor">
+    <h3>$path</h3>
+""" + REPORT_ENTRY + """</div>
+""")
+    index_template = Template("""<!DOCTYPE html>
+<html>
+
+<head>
+    <meta http-equiv="Content-Type" content="text/html; charset=utf-8" />
+    <title>Validation errors</title>
+    <link rel="stylesheet" type="text/css" href="style.css" />
+</head>
+
+<body>
+""" + REPORT_INFO + """$sections</body>
+</html>
+""")
+
+    def __init__(self, output_directory='errors', page_size=100, workers=4):
+        super().__init__(output_directory, workers, clean=False)
+        self.page_size = page_size
+
+    def _split(self, pages):
+        """
+        Returns a list of tuples of page file name, directory and paths of the files on the page.
+        """
+        sections = OrderedDict()
+        for path in sorted(pages):
+            sections.setdefault(str(Path(path).parent), []).append(path)
+        result = []
+        for section, paths in sections.items():
+            for number, start in enumerate(range(0, len(paths), self.page_size), 1):
+                name = '%s-%d.html' % (_slug(section), number)
+                result.append((name, section, paths[start:start + self.page_size]))
+        return result
+
+    def _write(self, name, content):
+        path = os.path.join(self.output_directory, name)
+        try:
+            with open(path) as fp:
+                if fp.read() == content:
+                    return
+        except FileNotFoundError:
+            pass
+        with open(path, 'w') as fp:
+            fp.write(content)
+
+    def _render_page(self, title, paths, pages):
+        entries = []
+        for path in paths:
+            content = {slot: '\n'.join(pages[path][slot]) for slot in self.slots}
+            entries.append(self.entry_template.substitute(content, anchor=_slug(path), path=html.escape(path)))
+        return self.page_template.substitute(title=html.escape(title), entries=''.join(entries))
+
+    def _render_index(self, split):
+        sections = []
+        for name, section, paths in split:
+            links = ['        <li><a href="%s#%s">%s</a></li>\n' % (name, _slug(path), html.escape(path))
+                     for path in paths]
+            sections.append('    <h4>%s</h4>\n    <ul>\n%s    </ul>\n' % (html.escape(section), ''.join(links)))
+        return self.index_template.substitute(sections=''.join(sections))
+
+    def _remove_stale(self, names):
+        for name in os.listdir(self.output_directory):
+            path = os.path.join(self.output_directory, name)
+            if name.endswith('.html') and name not in names and os.path.isfile(path):
+                os.remove(path)
+
+    def report(self, errors):
+        os.makedirs(self.output_directory, exist_ok=True)
+        pages = self._pages(errors)
+        split = self._split(pages)
+
+        def save(page):
+            name, section, paths = page
+            self._write(name, self._render_page(section, paths, pages))
+
+        with ThreadPoolExecutor(self.workers) as executor:
+            list(executor.map(save, split))
+        self._write('style.css', REPORT_STYLE)
+        self._write('index.html', self._render_index(split))
+        self._remove_stale(set(name for name, _, _ in split) | {'index.html'})
 
 
 class ConsoleReporter(object):
@@ -118,7 +268,7 @@ class ConsoleReporter(object):
     def report(self, errors):
         for error in errors:
             if isinstance(error, UrlDiff):
-                print('{} returned with code {}'.format(error.url, error.status_code))
+                print('{} {}'.format(error.url, error.status()))
                 for path in error.files:
                     print('\t{}'.format(str(path)))
                 print()
@@ -134,7 +284,7 @@ class StoreReporter(object):
     def report(self, errors):
         for error in errors:
             if isinstance(error, UrlDiff):
-                self.log.append('%s returned with code %s for files' % (error.url, error.status_code))
+                self.log.append('%s %s for files' % (error.url, error.status()))
                 for path in error.files:
                     self.log.append('\t%s' % str(path))
             if isinstance(error, MdDiff):